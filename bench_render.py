@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сравнение отрисовки текста карточек: ImageDraw.text против атласа глифов.
+
+1. Попиксельная проверка: для тем из posts/ карточки рисуются обоими
+   способами и сравниваются до JPEG-сжатия. Любое расхождение - код выхода 1.
+2. Бенчмарк: время вывода только текста и время полной карточки с сохранением.
+
+Пример:
+    python bench_render.py --repeat 50
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import bot
+from glyph_atlas import get_atlas
+from image_generator import load_background
+
+def collect_samples(limit: int) -> list:
+    """
+    Собирает (тема, месяц, день) из файлов постов.
+    """
+    samples = []
+    for filename in sorted(os.listdir(bot.POSTS_DIR)):
+        if not filename.endswith(".txt"):
+            continue
+        day, month = filename[:-4].split("-")
+        path = os.path.join(bot.POSTS_DIR, filename)
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for line in f:
+                if line.startswith("[") and "] " in line:
+                    theme = bot.extract_theme_from_post(line)
+                    samples.append((theme, bot.MONTHS_RU[int(month) - 1], day))
+                    if len(samples) >= limit:
+                        return samples
+    return samples
+
+def render_array(theme: str, month: str, day: str, text_renderer: str, output_dir: str) -> np.ndarray:
+    """
+    Рисует карточку и возвращает массив пикселей до JPEG-сжатия.
+    """
+    captured = {}
+    original_save = Image.Image.save
+
+    def capture(img, fp, *args, **kwargs):
+        captured["pixels"] = np.array(img)
+        open(fp, "wb").close()  # create_post_image подменяет итоговый файл этим
+
+    # Перехватываем сохранение, чтобы сравнивать несжатые пиксели
+    Image.Image.save = capture
+    try:
+        bot.create_post_image(theme, month, day, os.path.join(output_dir, "card.jpg"), text_renderer=text_renderer)
+    finally:
+        Image.Image.save = original_save
+    return captured.get("pixels")
+
+def check_pixels(samples: list, output_dir: str) -> int:
+    """
+    Сравнивает карточки двух способов отрисовки.
+
+    Returns:
+        Количество карточек с расхождениями
+    """
+    mismatched = 0
+    for theme, month, day in samples:
+        atlas = render_array(theme, month, day, "atlas", output_dir)
+        pillow = render_array(theme, month, day, "pillow", output_dir)
+        if atlas is None or pillow is None:
+            print(f"❌ Не удалось нарисовать: {day} {month} {theme!r}")
+            mismatched += 1
+            continue
+        diff = np.any(atlas != pillow, axis=2)
+        if diff.any():
+            mismatched += 1
+            max_delta = int(np.abs(atlas.astype(np.int16) - pillow.astype(np.int16)).max())
+            print(f"❌ {day} {month} {theme!r}: {int(diff.sum())} пикс., max Δ={max_delta}")
+    return mismatched
+
+def time_it(func, repeat: int) -> float:
+    """Среднее время вызова в миллисекундах."""
+    func()  # прогрев
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def benchmark(samples: list, repeat: int, output_dir: str):
+    background = load_background(bot.BACKGROUND_FILE, os.path.getmtime(bot.BACKGROUND_FILE))
+    atlas_month = get_atlas(bot.FONT_FILE, 90)
+    atlas_date = get_atlas(bot.FONT_FILE, 150)
+    items = []
+    for theme, month, day in samples:
+        items.append(((400, 220), month, atlas_month, "black"))
+        items.append(((700, 370), day, atlas_date, "red"))
+        items.append(((300, 580), theme.upper()[:30], atlas_month, "black"))
+
+    def text_pillow():
+        img = Image.fromarray(background.copy())
+        draw = ImageDraw.Draw(img)
+        for xy, text, atlas, fill in items:
+            draw.text(xy, text, font=atlas.font, fill=fill)
+
+    def text_atlas():
+        canvas = background.copy()
+        for xy, text, atlas, fill in items:
+            atlas.draw(canvas, xy, text, fill)
+
+    output_path = os.path.join(output_dir, "bench.jpg")
+    theme, month, day = samples[0]
+
+    results = {
+        "Только текст, pillow": time_it(text_pillow, repeat) / len(samples),
+        "Только текст, atlas": time_it(text_atlas, repeat) / len(samples),
+        "Карточка целиком, pillow": time_it(
+            lambda: bot.create_post_image(theme, month, day, output_path, text_renderer="pillow"), repeat),
+        "Карточка целиком, atlas": time_it(
+            lambda: bot.create_post_image(theme, month, day, output_path, text_renderer="atlas"), repeat),
+    }
+
+    print("=" * 50)
+    for name, value in results.items():
+        print(f"{name:<28} {value:8.2f} мс")
+    print(f"Ускорение текста:            "
+          f"{results['Только текст, pillow'] / results['Только текст, atlas']:.1f}x")
+    print(f"Ускорение карточки:          "
+          f"{results['Карточка целиком, pillow'] / results['Карточка целиком, atlas']:.2f}x")
+    print("=" * 50)
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк и попиксельная проверка атласа глифов")
+    parser.add_argument("--samples", type=int, default=200, help="Сколько тем проверить")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов в бенчмарке")
+    parser.add_argument("--check-only", action="store_true", help="Только попиксельная проверка")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    samples = collect_samples(args.samples)
+    if not samples:
+        samples = [("Народный календарь", bot.MONTHS_RU[datetime.now().month - 1], "01")]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        mismatched = check_pixels(samples, output_dir)
+        print(f"Попиксельная проверка: {len(samples) - mismatched}/{len(samples)} карточек совпадают")
+        if not args.check_only:
+            benchmark(samples, args.repeat, output_dir)
+
+    sys.exit(1 if mismatched else 0)
+
+if __name__ == "__main__":
+    main()
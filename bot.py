@@ -7,11 +7,30 @@ Telegram Bot для публикации постов с автоматичес
 """
 
 import os
+import asyncio
+import functools
+import hashlib
+import importlib
+import json
 import logging
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, time
-from telegram.ext import Application, CommandHandler, ContextTypes
-from PIL import Image, ImageDraw, ImageFont  # Для генерации изображений
+from typing import TYPE_CHECKING
+import image_generator  # Рендеринг карточек (одна реализация для бота и сервиса)
+from image_generator import RenderClient  # Клиент сервиса рендеринга
+from singleflight import SingleFlight  # Объединение одновременных запросов
+from work_scheduler import WorkRejected, WorkScheduler  # Приоритеты и очереди
+from calendars import Calendar, load_calendars  # Несколько календарей в одном процессе
+from profiling import Profiler  # Профилирование по запросу
+from deadline import SlotDeadline  # Бюджет задержки слота
+from health import HealthServer, StartupTimer  # Время запуска и готовность
+
+# python-telegram-bot импортируется при сборке приложения (build_application):
+# инструменты, которым нужны только посты и календари (export.py), его не грузят
+if TYPE_CHECKING:
+    from telegram.ext import Application, ContextTypes
 
 # ==================== НАСТРОЙКА ЛОГИРОВАНИЯ ====================
 logging.basicConfig(
@@ -36,6 +55,58 @@ GENERATED_DIR = "generated_images" # Папка для сгенерирован
 BACKGROUND_FILE = os.path.join(ASSETS_DIR, "fon.jpg")   # Фон 1600x1124
 FONT_FILE = os.path.join(FONTS_DIR, "GOST_A.TTF")       # Основной шрифт
 
+# Несколько календарей в одном процессе: путь к JSON-конфигурации (см. calendars.py).
+# Если не задан, бот обслуживает один календарь из переменных выше
+CALENDARS_CONFIG = os.getenv("CALENDARS_CONFIG", "").strip()
+
+# Общий для всех календарей пул потоков рендеринга и отдельные потоки
+# для публикаций по расписанию (не ждут в очереди за превью и /test)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+SCHEDULED_RENDER_WORKERS = int(os.getenv("SCHEDULED_RENDER_WORKERS", "1"))
+
+# Шаблон карточек по умолчанию (см. image_generator.TEMPLATES; в конфигурации
+# календаря - template). Способ отрисовки текста задает TEXT_RENDERER
+CARD_TEMPLATE = os.getenv("CARD_TEMPLATE", "bot").strip()
+
+# Сервис рендеринга (python image_generator.py); если не задан, карточки
+# рисуются в этом процессе
+RENDER_SERVICE_URL = os.getenv("RENDER_SERVICE_URL", "").strip()
+RENDER_SERVICE_TIMEOUT = float(os.getenv("RENDER_SERVICE_TIMEOUT", "30"))
+
+# Интерактивные команды: одновременные выполнения, длина очереди и лимит на пользователя
+INTERACTIVE_WORKERS = int(os.getenv("INTERACTIVE_WORKERS", "2"))
+INTERACTIVE_QUEUE_SIZE = int(os.getenv("INTERACTIVE_QUEUE_SIZE", "20"))
+USER_RATE_LIMIT = int(os.getenv("USER_RATE_LIMIT", "5"))         # команд за период
+USER_RATE_PERIOD = float(os.getenv("USER_RATE_PERIOD", "60"))    # секунд
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))           # соединений к Bot API
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))  # ожидание соединения, с
+# Ответы на отклоненные команды (причина WorkRejected -> текст)
+REJECTED_MESSAGES = {
+    "rate_limited": "⏳ Слишком много команд, попробуйте через минуту",
+    "queue_full": "⏳ Бот занят, попробуйте позже",
+}
+
+# Бюджет задержки слота по умолчанию (секунды от запуска задания; в конфигурации
+# календаря - slot_budget) и доли бюджета, к которым должны закончиться
+# рендеринг и отправка фото. Не уложились - пост деградирует (см. deadline.py)
+SLOT_BUDGET = float(os.getenv("SLOT_BUDGET", "120"))
+SLOT_RENDER_SHARE = float(os.getenv("SLOT_RENDER_SHARE", "0.5"))
+SLOT_PHOTO_SHARE = float(os.getenv("SLOT_PHOTO_SHARE", "0.75"))
+
+# Профилирование по запросу (см. profiling.py): папка с результатами и
+# взведение при старте на PROFILE_NEXT первых заданий/команд
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles").strip()
+PROFILE_NEXT = int(os.getenv("PROFILE_NEXT", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampling").strip()      # sampling или cprofile
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "0").strip() == "1"  # снимки tracemalloc
+
+# Пользователи (Telegram ID через запятую), которым доступны служебные команды (/profile)
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if user_id}
+
+# Эндпоинт живости/готовности (см. health.py); HEALTH_PORT=0 - выключен
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1").strip()
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8088"))
+
 # Часы публикации по Московскому времени (UTC+3)
 POST_HOURS = [6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20]
 
@@ -45,198 +116,57 @@ MONTHS_RU = [
     "ИЮЛЬ", "АВГУСТ", "СЕНТЯБРЬ", "ОКТЯБРЬ", "НОЯБРЬ", "ДЕКАБРЬ"
 ]
 
+# ==================== ПРОФИЛИРОВАНИЕ ====================
+# Пока профилировщик не взведен, обертки сводятся к проверке одного атрибута
+profiler = Profiler(PROFILE_DIR)
+
 # ==================== ФУНКЦИИ ГЕНЕРАЦИИ ИЗОБРАЖЕНИЙ ====================
-def create_post_image(theme: str, month: str, day: str, output_path: str) -> str:
+render_client = RenderClient(RENDER_SERVICE_URL, RENDER_SERVICE_TIMEOUT) if RENDER_SERVICE_URL else None
+
+@profiler.traced("create_post_image")
+def create_post_image(theme: str, month: str, day: str, output_path: str, *,
+                      text_renderer: str = None, background_file: str = None,
+                      font_file: str = None, template: str = None) -> str:
     """
-    Создает изображение для поста по шаблону.
+    Создает изображение для поста по шаблону (реализация - image_generator.py).
+    
+    Если задан RENDER_SERVICE_URL, карточку рисует сервис рендеринга с уже
+    прогретыми фонами и шрифтами; если сервис недоступен - этот процесс той же
+    функцией, так что карточка получается одинаковой.
     
     Args:
         theme: Тема поста (например, "ДЕНЬ В ИСТОРИИ: Луи Дагер")
         month: Название месяца (например, "ЯНВАРЬ")
         day: Число дня (например, "07")
         output_path: Путь для сохранения готового изображения
+        text_renderer: "atlas" (атлас глифов + NumPy) или "pillow" (ImageDraw.text)
+        background_file: Фон календаря (по умолчанию - BACKGROUND_FILE)
+        font_file: Шрифт календаря (по умолчанию - FONT_FILE)
+        template: Шаблон карточки (по умолчанию - CARD_TEMPLATE)
         
     Returns:
         Путь к созданному изображению или None в случае ошибки
     """
+    template = template or CARD_TEMPLATE
+    background_file = background_file or BACKGROUND_FILE
+    font_file = font_file or FONT_FILE
     
-    def remove_emoji_and_special(text):
-        """
-        Удаляет эмодзи и специальные символы, оставляя только кириллицу, латиницу, цифры и основные знаки препинания.
-        """
-        if not text:
-            return ""
-        
-        # Расширенный шаблон для эмодзи и специальных символов
-        emoji_pattern = re.compile(
-            "["
-            u"\U0001F600-\U0001F64F"  # эмотиконы
-            u"\U0001F300-\U0001F5FF"  # символы и пиктограммы
-            u"\U0001F680-\U0001F6FF"  # транспорт и карта
-            u"\U0001F1E0-\U0001F1FF"  # флаги (iOS)
-            u"\U00002500-\U00002BEF"  # различные символы
-            u"\U00002702-\U000027B0"
-            u"\U000024C2-\U0001F251"
-            u"\U0001f926-\U0001f937"
-            u"\U00010000-\U0010ffff"
-            u"\u2640-\u2642"
-            u"\u2600-\u2B55"
-            u"\u200d"  # символ соединения (для составных эмодзи)
-            u"\u23cf"
-            u"\u23e9"
-            u"\u231a"
-            u"\ufe0f"  # вариационный селектор-16
-            u"\u3030"
-            u"\u00A9\u00AE\u2122"  # знаки авторского права, товарные знаки
-            "]+",
-            flags=re.UNICODE,
-        )
-        
-        # Удаляем эмодзи по шаблону
-        text = emoji_pattern.sub(r'', text)
-        
-        # Дополнительно: удаляем оставшиеся непечатные и специальные символы,
-        # оставляя только кириллицу, латиницу, цифры, пробелы и основные знаки препинания
-        allowed_chars_pattern = re.compile(
-            r'[^'
-            r'a-zA-Zа-яА-ЯёЁ'  # латиница и кириллица
-            r'0-9'             # цифры
-            r'\s'              # пробелы
-            r'.,:;!?\-–—()\[\]{}«»"\''
-            r']+'
-        )
-        text = allowed_chars_pattern.sub(r'', text)
-        
-        return text.strip()
+    if render_client is not None:
+        try:
+            # Сервис может работать в другой папке - передаем абсолютные пути
+            return render_client.create_post_image(
+                theme, month, day, os.path.abspath(output_path),
+                template=template, text_renderer=text_renderer,
+                background_file=os.path.abspath(background_file),
+                font_file=os.path.abspath(font_file),
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Сервис рендеринга недоступен ({e}), рисуем в процессе")
     
-    try:
-        # Проверяем наличие необходимых файлов
-        if not os.path.exists(BACKGROUND_FILE):
-            logger.error(f"Фоновое изображение не найдено: {BACKGROUND_FILE}")
-            return None
-        
-        if not os.path.exists(FONT_FILE):
-            logger.error(f"Шрифт не найден: {FONT_FILE}")
-            return None
-        
-        # 1. Открываем фоновое изображение
-        img = Image.open(BACKGROUND_FILE)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        draw = ImageDraw.Draw(img)
-        img_width, img_height = img.size
-        
-        # 2. Загружаем шрифты с разными размерами (оптимизированные для компактности)
-        font_month = ImageFont.truetype(FONT_FILE, 90)      # Месяц
-        font_date = ImageFont.truetype(FONT_FILE, 150)      # Дата (крупно)
-        font_theme = ImageFont.truetype(FONT_FILE, 90)      # Тема
-        
-        # 3. Координаты и параметры (оптимизированные для более компактного и нижнего расположения)
-        start_y = 220                    # Начальная позиция по Y (сдвинута вниз)
-        line_height = 20                 # Расстояние между элементами
-        line_thickness = 3               # Толщина черт
-        
-        # Функция для расчета центральной позиции по X
-        def get_center_x(text, font):
-            # Используем textlength для новых версий Pillow
-            try:
-                text_width = draw.textlength(text, font=font)
-            except AttributeError:
-                # Для старых версий Pillow
-                bbox = draw.textbbox((0, 0), text, font=font)
-                text_width = bbox[2] - bbox[0]
-            return (img_width - text_width) // 2
-        
-        # ========== ВАЖНО: ОЧИСТКА ТЕМЫ ПЕРЕД ИСПОЛЬЗОВАНИЕМ ==========
-        # Логируем исходную тему для отладки
-        logger.debug(f"[ГЕНЕРАТОР] Тема ДО очистки: {repr(theme)}")
-        
-        # Очищаем тему от эмодзи и специальных символов
-        theme_cleaned = remove_emoji_and_special(theme)
-        
-        # Логируем результат очистки
-        logger.debug(f"[ГЕНЕРАТОР] Тема ПОСЛЕ очистки: {repr(theme_cleaned)}")
-        
-        # Используем очищенную тему для дальнейшей обработки
-        theme = theme_cleaned
-        # =============================================================
-        
-        # 4. Рисуем месяц (черный)
-        month_x = get_center_x(month, font_month)
-        month_y = start_y
-        draw.text((month_x, month_y), month, font=font_month, fill="black")
-        
-        # 5. Черта под месяцем
-        month_width = draw.textlength(month, font=font_month)
-        line1_y = month_y + font_month.size + line_height
-        draw.line(
-            [(month_x, line1_y), (month_x + month_width, line1_y)],
-            fill="black",
-            width=line_thickness
-        )
-        
-        # 6. Рисуем дату (красная, крупно)
-        date_y = line1_y + line_height * 2
-        day_x = get_center_x(day, font_date)
-        draw.text((day_x, date_y), day, font=font_date, fill="red")
-        
-        # 7. Черта под датой
-        date_width = draw.textlength(day, font=font_date)
-        line2_y = date_y + font_date.size + line_height
-        draw.line(
-            [(day_x, line2_y), (day_x + date_width, line2_y)],
-            fill="black",
-            width=line_thickness
-        )
-        
-        # 8. Рисуем тему поста (черный)
-        theme_y = line2_y + line_height * 2
-        
-        # Улучшенный перенос строк: используем ширину изображения вместо фиксированного количества символов
-        theme_lines = []
-        max_line_width = img_width * 0.6  # Максимальная ширина строки - 80% от ширины изображения
-        
-        words = theme.split()
-        current_line = ""
-        
-        for word in words:
-            test_line = f"{current_line} {word}".strip()
-            # Проверяем ширину строки с новым словом
-            if draw.textlength(test_line, font=font_theme) <= max_line_width:
-                current_line = test_line
-            else:
-                if current_line:  # Сохраняем текущую строку, если она не пустая
-                    theme_lines.append(current_line)
-                current_line = word  # Начинаем новую строку с текущего слова
-        
-        if current_line:  # Добавляем последнюю строку
-            theme_lines.append(current_line)
-        
-        # Если после очистки тема стала пустой, используем заглушку
-        if not theme_lines or all(not line.strip() for line in theme_lines):
-            theme_lines = ["Народный календарь"]
-            logger.debug("[ГЕНЕРАТОР] Тема оказалась пустой после очистки, использована заглушка")
-        
-        # Рисуем каждую строку темы (с уменьшенным межстрочным интервалом)
-        theme_line_spacing = 8
-        
-        for i, line in enumerate(theme_lines):
-            theme_x = get_center_x(line, font_theme)
-            current_theme_y = theme_y + i * (font_theme.size + theme_line_spacing)
-            draw.text((theme_x, current_theme_y), line, font=font_theme, fill="black")
-        
-        # 9. Создаем папку для результата, если её нет
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # 10. Сохраняем изображение
-        img.save(output_path, "JPEG", quality=95)
-        logger.info(f"✅ Изображение создано: {output_path}")
-        return output_path
-        
-    except Exception as e:
-        logger.error(f"❌ Ошибка при создании изображения: {e}", exc_info=True)
-        return None
+    return image_generator.create_post_image(
+        theme, month, day, output_path, template=template, text_renderer=text_renderer,
+        background_file=background_file, font_file=font_file,
+    )
 
 def extract_theme_from_post(post_text: str) -> str:
     """
@@ -322,72 +252,331 @@ def load_post_for_hour(target_hour: int) -> str:
     Загружает пост для указанного часа из файла с текущей датой.
     """
     now = datetime.now()
-    filename = f"{POSTS_DIR}/{now.day:02d}-{now.month:02d}.txt"
+    return load_post(now.day, now.month, target_hour)
+
+def parse_post_file(filename: str) -> dict:
+    """
+    Разбирает файл дня на посты по часам (файл читается построчно).
+    
+    Returns:
+        Словарь {час: текст поста}
+    """
+    posts = {}
+    current_hour = None
+    current_content = []
+    
+    with open(filename, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            raw_line = line.rstrip('\n\r')
+            
+            if raw_line.startswith('[') and '] ' in raw_line:
+                if current_hour is not None and current_content:
+                    posts[current_hour] = "\n".join(current_content).strip()
+                
+                try:
+                    time_part = raw_line.split(']')[0][1:]
+                    hour = int(time_part.split(':')[0])
+                    current_hour = hour
+                    content_part = raw_line.split('] ', 1)[1]
+                    current_content = [content_part] if content_part.strip() else []
+                except (IndexError, ValueError):
+                    current_hour = None
+                    current_content = []
+            else:
+                if current_hour is not None:
+                    current_content.append(raw_line)
+    
+    if current_hour is not None and current_content:
+        posts[current_hour] = "\n".join(current_content).strip()
+    
+    return posts
+
+def load_post(day: int, month: int, target_hour: int, posts_dir: str = None) -> str:
+    """
+    Загружает пост для указанного часа из файла с указанной датой.
+    """
+    filename = f"{posts_dir or POSTS_DIR}/{day:02d}-{month:02d}.txt"
     
     if not os.path.exists(filename):
         logger.warning(f"Файл не найден: {filename}")
         return ""
     
     try:
-        with open(filename, 'r', encoding='utf-8-sig') as f:
-            lines = f.readlines()
+        posts = parse_post_file(filename)
     except Exception as e:
         logger.error(f"Ошибка чтения файла {filename}: {e}")
         return ""
     
-    posts = {}
-    current_hour = None
-    current_content = []
+    return posts.get(target_hour, "")
+
+# ==================== КАЛЕНДАРИ ====================
+def get_calendars() -> list:
+    """
+    Календари процесса: из CALENDARS_CONFIG или один календарь из констант выше.
+    """
+    defaults = {
+        "name": "main",
+        "channel": CHANNEL,
+        "posts_dir": POSTS_DIR,
+        "background_file": BACKGROUND_FILE,
+        "font_file": FONT_FILE,
+        "post_hours": POST_HOURS,
+        "generated_dir": GENERATED_DIR,
+        "slot_budget": SLOT_BUDGET,
+        "template": CARD_TEMPLATE,
+    }
+    calendars = load_calendars(CALENDARS_CONFIG, defaults) if CALENDARS_CONFIG else [Calendar(**defaults)]
+    for calendar in calendars:
+        if calendar.template not in image_generator.TEMPLATES:
+            raise ValueError(f"Календарь {calendar.name!r}: неизвестный шаблон {calendar.template!r}")
+    return calendars
+
+def resolve_calendar(context):
+    """
+    Календарь команды: первый аргумент, если это имя календаря, иначе первый в списке.
     
-    for line_num, line in enumerate(lines, 1):
-        raw_line = line.rstrip('\n\r')
-        
-        if raw_line.startswith('[') and '] ' in raw_line:
-            if current_hour is not None and current_content:
-                posts[current_hour] = "\n".join(current_content).strip()
-            
-            try:
-                time_part = raw_line.split(']')[0][1:]
-                hour = int(time_part.split(':')[0])
-                current_hour = hour
-                content_part = raw_line.split('] ', 1)[1]
-                current_content = [content_part] if content_part.strip() else []
-            except (IndexError, ValueError):
-                current_hour = None
-                current_content = []
-        else:
-            if current_hour is not None:
-                current_content.append(raw_line)
+    Returns:
+        Кортеж (календарь, оставшиеся аргументы)
+    """
+    calendars = context.bot_data["calendars"]
+    args = list(context.args or [])
+    if args:
+        for calendar in calendars:
+            if calendar.name == args[0]:
+                return calendar, args[1:]
+    return calendars[0], args
+
+# ==================== ПОДГОТОВКА СЛОТОВ ====================
+# Рендеринг всех календарей идет через один пул потоков; фоны и атласы
+# глифов кэшируются по пути к файлу и тоже общие. Публикации по расписанию
+# рисуются в своем пуле: строгий приоритет соблюдается и после допуска.
+render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+scheduled_render_executor = ThreadPoolExecutor(
+    max_workers=SCHEDULED_RENDER_WORKERS, thread_name_prefix="render-scheduled"
+)
+
+# Одновременные запросы одного слота (превью нескольких редакторов,
+# превью и задание по расписанию) выполняются один раз
+post_flight = SingleFlight("posts", maxsize=64)
+image_flight = SingleFlight("images", maxsize=64, executor=render_executor)
+
+def file_mtime(path: str) -> float:
+    """Время изменения файла для ключей кэша (None, если файла нет)."""
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+async def get_slot_post(calendar: Calendar, day: int, month: int, hour: int) -> str:
+    """
+    Текст поста для слота; время изменения файла входит в ключ кэша.
+    """
+    filename = calendar.post_filename(day, month)
+    key = (calendar.posts_dir, day, month, hour, file_mtime(filename))
+    return await post_flight.do(key, load_post, day, month, hour, calendar.posts_dir)
+
+def slot_image_path(calendar: Calendar, day: int, month: int, hour: int) -> str:
+    """Файл карточки слота."""
+    return os.path.join(calendar.generated_dir, f"post_{day:02d}_{month:02d}_{hour:02d}.jpg")
+
+def card_fingerprint(calendar: Calendar, theme: str) -> str:
+    """
+    Отпечаток карточки: тема, шаблон, фон и шрифт (с временем изменения).
+    Хранится рядом с карточкой в файле .key (см. render_slot_card).
+    """
+    data = json.dumps([
+        theme, calendar.template,
+        calendar.background_file, file_mtime(calendar.background_file),
+        calendar.font_file, file_mtime(calendar.font_file),
+    ], ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def render_slot_card(calendar: Calendar, theme: str, day: int, month: int, hour: int) -> str:
+    """
+    Рисует карточку слота и записывает ее отпечаток. Пока карточка рисуется,
+    прежние карточка и отпечаток остаются на месте (save_card подменяет файл
+    целиком) и годятся для публикации из кэша; новый отпечаток записывается
+    только после успешного рендеринга.
     
-    if current_hour is not None and current_content:
-        posts[current_hour] = "\n".join(current_content).strip()
+    Returns:
+        Путь к изображению или None в случае ошибки
+    """
+    image_path = slot_image_path(calendar, day, month, hour)
+    key_path = f"{image_path}.key"
+    created_image = create_post_image(
+        theme, MONTHS_RU[month - 1], f"{day:02d}", image_path,
+        background_file=calendar.background_file, font_file=calendar.font_file,
+        template=calendar.template,
+    )
+    if created_image:
+        temp_path = f"{key_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(card_fingerprint(calendar, theme))
+        os.replace(temp_path, key_path)
+    return created_image
+
+def cached_slot_image(calendar: Calendar, theme: str, day: int, month: int, hour: int) -> str:
+    """
+    Карточка, нарисованная для слота раньше (превью, прошлый запуск), без рендеринга.
+    Принимается, только если нарисована для этой темы с текущими шаблоном,
+    фоном и шрифтом: имя файла не содержит ни года, ни темы.
     
-    return posts.get(target_hour, "")
+    Returns:
+        Путь к изображению или None, если подходящей карточки нет
+    """
+    image_path = slot_image_path(calendar, day, month, hour)
+    try:
+        with open(f"{image_path}.key", "r", encoding="utf-8") as f:
+            fingerprint = f.read().strip()
+    except OSError:
+        return None
+    if fingerprint != card_fingerprint(calendar, theme) or not os.path.exists(image_path):
+        return None
+    return image_path
+
+async def get_slot_image(calendar: Calendar, theme: str, day: int, month: int, hour: int,
+                         scheduled: bool = False) -> str:
+    """
+    Изображение для слота: тот же файл, что публикуется по расписанию.
+    Карточка на диске с подходящим отпечатком берется без рендеринга.
+    
+    Args:
+        scheduled: Публикация по расписанию - рисуется в scheduled_render_executor
+    
+    Returns:
+        Путь к изображению или None в случае ошибки
+    """
+    cached_image = cached_slot_image(calendar, theme, day, month, hour)
+    if cached_image:
+        return cached_image
+    
+    image_path = slot_image_path(calendar, day, month, hour)
+    # Время изменения фона и шрифта в ключе: после замены файла карточка рисуется заново
+    key = (
+        image_path, theme, calendar.template,
+        calendar.background_file, file_mtime(calendar.background_file),
+        calendar.font_file, file_mtime(calendar.font_file),
+    )
+    render_args = (calendar, theme, day, month, hour)
+    
+    # Все темы слота пишут в один файл: раз отпечаток на диске не подошел, файл
+    # перерисован для другой темы (или удален), и готовый результат по ключу устарел
+    image_flight.forget(key)
+    executor = scheduled_render_executor if scheduled else None
+    return await image_flight.do(key, render_slot_card, *render_args, executor=executor)
+
+# ==================== ПЛАНИРОВЩИК РАБОТЫ ====================
+# Публикации по расписанию имеют строгий приоритет над командами пользователей
+work_scheduler = WorkScheduler(
+    interactive_workers=INTERACTIVE_WORKERS,
+    interactive_queue_size=INTERACTIVE_QUEUE_SIZE,
+    user_rate=USER_RATE_LIMIT,
+    user_period=USER_RATE_PERIOD,
+)
+
+def scheduled_job(callback):
+    """
+    Обертка задания по расписанию: выполняется через планировщик без очереди.
+    """
+    @functools.wraps(callback)
+    async def wrapper(context):
+        return await work_scheduler.run_scheduled(profiler.run, context.job.name, callback, context)
+    return wrapper
+
+def interactive_command(handler, profiled: bool = True):
+    """
+    Обертка команды: ограниченная очередь и лимит частоты на пользователя.
+    При отказе пользователь сразу получает ответ, работа не выполняется.
+    profiled=False - команда не попадает в профилирование (например, сама /profile).
+    """
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        user_id = update.effective_user.id if update.effective_user else None
+        work = (profiler.run, handler.__name__, handler) if profiled else (handler,)
+        try:
+            return await work_scheduler.run_interactive(user_id, *work, update, context)
+        except WorkRejected as e:
+            logger.warning(f"⏳ Команда отклонена ({e.reason}) для пользователя {user_id}")
+            await update.message.reply_text(REJECTED_MESSAGES.get(e.reason, REJECTED_MESSAGES["queue_full"]))
+    return wrapper
 
 # ==================== ФУНКЦИИ БОТА ====================
-async def send_scheduled_post(context: ContextTypes.DEFAULT_TYPE):
+# Слоты (календарь, "ДД-ММ ЧЧ:00"), которые публикуются прямо сейчас
+running_slots = set()
+
+async def send_alert(bot, text: str):
+    """
+    Оповещение администраторам (ADMIN_IDS); ошибки отправки только логируются.
+    """
+    for admin_id in ADMIN_IDS:
+        try:
+            await bot.send_message(chat_id=admin_id, text=text)
+        except Exception as e:
+            logger.error(f"❌ Не удалось отправить оповещение {admin_id}: {e}")
+
+def record_slot_latency(calendar: Calendar, deadline: SlotDeadline, slot_name: str, outcome: str):
+    """
+    Записывает достигнутую задержку слота относительно бюджета.
+    """
+    latency = deadline.elapsed()
+    calendar.latencies.append(latency)
+    message = (f"⏱ [{calendar.name}] Слот {slot_name}: {latency:.2f} с из {calendar.slot_budget:.0f} с "
+               f"({outcome}; {deadline.summary() or '-'})")
+    if latency > calendar.slot_budget:
+        calendar.metrics["over_budget"] += 1
+        logger.warning(message)
+    else:
+        logger.info(message)
+
+async def send_scheduled_post(context: "ContextTypes.DEFAULT_TYPE"):
     """
     Функция, вызываемая по расписанию для публикации постов с изображениями.
+    Календарь слота передается в context.job.data.
+    
+    Публикация укладывается в бюджет календаря (slot_budget): этап, не
+    успевший в свою долю бюджета, отменяется, и пост деградирует -
+    свежая карточка -> карточка из кэша -> только текст -> пропуск
+    с оповещением администраторам.
     """
+    calendar = context.job.data
+    deadline = SlotDeadline(calendar.slot_budget, SLOT_RENDER_SHARE, SLOT_PHOTO_SHARE)
+    slot_key = None
+    outcome = None
+    alert = None
     try:
         # Определяем текущий час по МСК
         utc_hour = datetime.utcnow().hour
         moscow_hour = (utc_hour + 3) % 24
         
-        if moscow_hour not in POST_HOURS:
+        if moscow_hour not in calendar.post_hours:
             return
         
-        # Загружаем пост для текущего часа
-        post_text = load_post_for_hour(moscow_hour)
+        # Получаем текущую дату
+        now = datetime.now()
+        slot_name = f"{now.day:02d}-{now.month:02d} {moscow_hour:02d}:00"
         
-        if not post_text or not post_text.strip():
-            logger.warning(f"Нет контента для публикации в {moscow_hour}:00 МСК")
+        # Один и тот же слот не публикуется двумя заданиями одновременно
+        if (calendar.name, slot_name) in running_slots:
+            logger.warning(f"⏱ [{calendar.name}] Слот {slot_name} уже публикуется, повторный запуск пропущен")
             return
+        slot_key = (calendar.name, slot_name)
+        running_slots.add(slot_key)
         
-        # Получаем текущую дату
-        now = datetime.now()
-        month_ru = MONTHS_RU[now.month - 1]
-        day = now.strftime("%d")
+        # Загружаем пост для текущего часа (без текста публиковать нечего,
+        # поэтому срок - до конца отправки фото)
+        try:
+            post_text = await deadline.stage(
+                "post", get_slot_post(calendar, now.day, now.month, moscow_hour), SLOT_PHOTO_SHARE
+            )
+        except asyncio.TimeoutError:
+            calendar.metrics["skipped_deadline"] += 1
+            outcome = "skipped"
+            alert = f"⏱ [{calendar.name}] Слот {slot_name} пропущен: пост не загрузился за бюджет"
+            logger.error(alert)
+            return
+        
+        if not post_text or not post_text.strip():
+            calendar.metrics["no_content"] += 1
+            logger.warning(f"[{calendar.name}] Нет контента для публикации в {moscow_hour}:00 МСК")
+            return
+        outcome = "failed"
         
         # Извлекаем тему поста
         theme = extract_theme_from_post(post_text)
@@ -395,52 +584,88 @@ async def send_scheduled_post(context: ContextTypes.DEFAULT_TYPE):
         # Проверяем длину поста (ограничение Telegram)
         if len(post_text) > 4000:
             post_text = post_text[:4000] + "\n\n..."
-            logger.warning(f"Пост для {moscow_hour}:00 обрезан до 4000 символов")
+            logger.warning(f"[{calendar.name}] Пост для {moscow_hour}:00 обрезан до 4000 символов")
         
         # Подготавливаем текст для отправки
         safe_text = escape_markdown_v2(post_text)
         
-        # Создаем уникальное имя файла для изображения
-        image_filename = f"post_{now.day:02d}_{now.month:02d}_{moscow_hour:02d}.jpg"
-        image_path = os.path.join(GENERATED_DIR, image_filename)
-        
-        # 1. Создаем и отправляем изображение
-        created_image = create_post_image(theme, month_ru, day, image_path)
+        # 1. Создаем (или берем готовое после превью) изображение. Рендеринг
+        #    при таймауте не прерывается и докешируется в фоне, а слот берет
+        #    карточку, нарисованную для него раньше, если она есть
+        from_cache = False
+        try:
+            created_image = await deadline.stage(
+                "render",
+                asyncio.shield(get_slot_image(calendar, theme, now.day, now.month, moscow_hour, scheduled=True)),
+                SLOT_RENDER_SHARE,
+            )
+        except asyncio.TimeoutError:
+            created_image = cached_slot_image(calendar, theme, now.day, now.month, moscow_hour)
+            from_cache = created_image is not None
+            logger.warning(f"⏱ [{calendar.name}] Рендеринг {slot_name} не уложился в бюджет, "
+                           f"{'берем карточку из кэша' if from_cache else 'публикуем текст'}")
         
         if created_image and os.path.exists(created_image):
             try:
                 with open(created_image, 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=CHANNEL,
+                    await deadline.stage("photo", context.bot.send_photo(
+                        chat_id=calendar.channel,
                         photo=photo,
                         caption=safe_text,
                         parse_mode="MarkdownV2",
                         disable_notification=False
-                    )
-                logger.info(f"ߖݯ؏ Пост с изображением опубликован в {moscow_hour}:00 МСК")
+                    ), SLOT_PHOTO_SHARE)
+                calendar.metrics["published_cached" if from_cache else "published_photo"] += 1
+                calendar.metrics["last_published"] = now.strftime("%d.%m %H:%M")
+                outcome = "cached" if from_cache else "photo"
+                logger.info(f"ߖݯ؏ [{calendar.name}] Пост с изображением опубликован в {moscow_hour}:00 МСК")
                 return
+            except asyncio.TimeoutError:
+                logger.warning(f"⏱ [{calendar.name}] Фото {slot_name} не отправлено за бюджет, публикуем текст")
             except Exception as e:
                 logger.error(f"⚠️ Не удалось отправить изображение: {e}")
                 # Продолжаем с отправкой текста
         
-        # 2. Если изображение не создалось, отправляем только текст
-        await context.bot.send_message(
-            chat_id=CHANNEL,
-            text=safe_text,
-            parse_mode="MarkdownV2",
-            disable_web_page_preview=True,
-            disable_notification=False
-        )
-        logger.info(f"✅ Текстовый пост опубликован в {moscow_hour}:00 МСК")
+        # 2. Если изображение не создалось или не успело уйти, отправляем только текст
+        try:
+            await deadline.stage("text", context.bot.send_message(
+                chat_id=calendar.channel,
+                text=safe_text,
+                parse_mode="MarkdownV2",
+                disable_web_page_preview=True,
+                disable_notification=False
+            ))
+        except asyncio.TimeoutError:
+            # 3. Бюджет исчерпан: слот пропускается, администраторы получают оповещение
+            calendar.metrics["skipped_deadline"] += 1
+            outcome = "skipped"
+            alert = (f"⏱ [{calendar.name}] Слот {slot_name} пропущен: бюджет "
+                     f"{calendar.slot_budget:.0f} с исчерпан ({deadline.summary()})")
+            logger.error(alert)
+            return
+        calendar.metrics["published_text"] += 1
+        calendar.metrics["last_published"] = now.strftime("%d.%m %H:%M")
+        outcome = "text"
+        logger.info(f"✅ [{calendar.name}] Текстовый пост опубликован в {moscow_hour}:00 МСК")
         
     except Exception as e:
-        logger.error(f"❌ Критическая ошибка при публикации: {e}", exc_info=True)
+        calendar.metrics["failed"] += 1
+        logger.error(f"❌ [{calendar.name}] Критическая ошибка при публикации: {e}", exc_info=True)
+    
+    finally:
+        if slot_key:
+            running_slots.discard(slot_key)
+        if outcome:
+            record_slot_latency(calendar, deadline, slot_name, outcome)
+        if alert:
+            await send_alert(context.bot, alert)
 
 async def cmd_test(update, context):
     """
-    Команда /test - отправляет тестовый пост с изображением
+    Команда /test [календарь] - отправляет тестовый пост с изображением
     """
     try:
+        calendar, _ = resolve_calendar(context)
         now = datetime.now()
         month_ru = MONTHS_RU[now.month - 1]
         day = now.strftime("%d")
@@ -448,9 +673,14 @@ async def cmd_test(update, context):
         
         # Создаем тестовое изображение
         image_filename = f"test_{int(datetime.now().timestamp())}.jpg"
-        image_path = os.path.join(GENERATED_DIR, image_filename)
+        image_path = os.path.join(calendar.generated_dir, image_filename)
         
-        created_image = create_post_image(theme, month_ru, day, image_path)
+        loop = asyncio.get_running_loop()
+        created_image = await loop.run_in_executor(render_executor, functools.partial(
+            create_post_image, theme, month_ru, day, image_path,
+            background_file=calendar.background_file, font_file=calendar.font_file,
+            template=calendar.template,
+        ))
         
         test_text = (
             "*Тестовый пост с изображением*\n\n"
@@ -468,7 +698,7 @@ async def cmd_test(update, context):
         if created_image and os.path.exists(created_image):
             with open(created_image, 'rb') as photo:
                 await context.bot.send_photo(
-                    chat_id=CHANNEL,
+                    chat_id=calendar.channel,
                     photo=photo,
                     caption=safe_text,
                     parse_mode="MarkdownV2"
@@ -476,23 +706,86 @@ async def cmd_test(update, context):
             message = "✅ Тестовый пост с изображением отправлен в канал!"
         else:
             await context.bot.send_message(
-                chat_id=CHANNEL,
+                chat_id=calendar.channel,
                 text=safe_text,
                 parse_mode="MarkdownV2"
             )
             message = "✅ Тестовый пост отправлен (без изображения)!"
         
-        await update.message.reply_text(f"{message}\nПроверьте: {CHANNEL}")
+        await update.message.reply_text(f"{message}\nПроверьте: {calendar.channel}")
         
     except Exception as e:
         error_msg = f"❌ Ошибка при отправке тестового поста: {e}"
         logger.error(error_msg)
         await update.message.reply_text(error_msg)
 
+async def cmd_preview(update, context):
+    """
+    Команда /preview [календарь] ДД-ММ ЧЧ - показывает карточку и подпись будущего слота
+    """
+    usage = "Использование: /preview [календарь] ДД-ММ ЧЧ (например, /preview 07-01 14)"
+    calendar, args = resolve_calendar(context)
+    try:
+        date_arg, hour_arg = args
+        day, month = (int(part) for part in date_arg.split("-"))
+        hour = int(hour_arg.split(":")[0])
+        datetime(2024, month, day)  # високосный год - допускаем 29-02
+        if not 0 <= hour <= 23:
+            raise ValueError(hour)
+    except (TypeError, ValueError):
+        await update.message.reply_text(usage)
+        return
+    
+    try:
+        post_text = await get_slot_post(calendar, day, month, hour)
+        if not post_text or not post_text.strip():
+            await update.message.reply_text(f"Нет поста на {day:02d}-{month:02d} {hour:02d}:00")
+            return
+        
+        # Подпись - ровно та, что уйдет в канал
+        theme = extract_theme_from_post(post_text)
+        if len(post_text) > 4000:
+            post_text = post_text[:4000] + "\n\n..."
+        safe_text = escape_markdown_v2(post_text)
+        
+        created_image = await get_slot_image(calendar, theme, day, month, hour)
+        
+        await update.message.reply_text(
+            f"👁 Предпросмотр [{calendar.name}] {day:02d}-{month:02d} {hour:02d}:00 "
+            f"({'в расписании' if hour in calendar.post_hours else 'вне расписания'})"
+        )
+        if created_image and os.path.exists(created_image):
+            try:
+                with open(created_image, 'rb') as photo:
+                    await update.message.reply_photo(
+                        photo=photo,
+                        caption=safe_text,
+                        parse_mode="MarkdownV2"
+                    )
+                return
+            except Exception as e:
+                # В канале в этом случае тоже уйдет только текст
+                logger.warning(f"⚠️ Превью: изображение с подписью не отправлено: {e}")
+        
+        await update.message.reply_text(
+            safe_text,
+            parse_mode="MarkdownV2",
+            disable_web_page_preview=True
+        )
+        
+    except Exception as e:
+        error_msg = f"❌ Ошибка при подготовке превью: {e}"
+        logger.error(error_msg)
+        await update.message.reply_text(error_msg)
+
 async def cmd_start(update, context):
     """
     Команда /start - приветственное сообщение
     """
+    calendars_text = "\n".join(
+        f"• {calendar.name}: {calendar.channel}, часы (МСК): {', '.join(map(str, calendar.post_hours))}"
+        for calendar in context.bot_data["calendars"]
+    )
     welcome_text = (
         "ߤ֠*Бот Народный Календарь*\n\n"
         "Я публикую посты в канал по расписанию *с автоматической генерацией изображений*.\n\n"
@@ -504,10 +797,11 @@ async def cmd_start(update, context):
         "• Тема поста (черный)\n\n"
         "*Команды:*\n"
         "/start - это сообщение\n"
-        "/test - отправить тестовый пост с изображением\n"
-        "/status - информация о состоянии бота\n\n"
-        f"Канал: {CHANNEL}\n"
-        f"Часы публикации (МСК): {', '.join(map(str, POST_HOURS))}"
+        "/test [календарь] - отправить тестовый пост с изображением\n"
+        "/preview [календарь] ДД-ММ ЧЧ - предпросмотр поста и карточки слота\n"
+        "/status - информация о состоянии бота\n"
+        "/profile N - профилировать следующие N заданий или команд (для администраторов)\n\n"
+        f"*Календари:*\n{calendars_text}"
     )
     
     await update.message.reply_text(
@@ -523,31 +817,60 @@ async def cmd_status(update, context):
     utc_hour = now.hour
     moscow_hour = (utc_hour + 3) % 24
     
-    # Проверяем наличие необходимых файлов и папок
-    checks = {
-        "Фон (fon.jpg)": os.path.exists(BACKGROUND_FILE),
-        "Шрифт (GOST_A.TTF)": os.path.exists(FONT_FILE),
-        "Папка с постами": os.path.exists(POSTS_DIR),
-        "Папка для изображений": os.path.exists(GENERATED_DIR),
-    }
-    
-    check_results = "\n".join([
-        f"{'✅' if status else '❌'} {name}"
-        for name, status in checks.items()
-    ])
+    # Проверяем наличие необходимых файлов и папок каждого календаря
+    calendar_results = []
+    for calendar in context.bot_data["calendars"]:
+        checks = {
+            f"Фон ({os.path.basename(calendar.background_file)})": os.path.exists(calendar.background_file),
+            f"Шрифт ({os.path.basename(calendar.font_file)})": os.path.exists(calendar.font_file),
+            "Папка с постами": os.path.exists(calendar.posts_dir),
+            "Папка для изображений": os.path.exists(calendar.generated_dir),
+        }
+        check_results = "\n".join([
+            f"{'✅' if status else '❌'} {name}"
+            for name, status in checks.items()
+        ])
+        
+        # Проверяем наличие файла на сегодня
+        filename = calendar.post_filename(now.day, now.month)
+        file_exists = os.path.exists(filename)
+        metrics = calendar.metrics
+        latencies = sorted(calendar.latencies) or [0.0]
+        latency_p50 = latencies[len(latencies) // 2]
+        latency_p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        
+        calendar_results.append(
+            f"*{calendar.name}* ({calendar.channel})\n"
+            f"• *Файл на сегодня:* {'✅' if file_exists else '❌'} {filename}\n"
+            f"• *Следующий пост:* {'Скоро' if moscow_hour in calendar.post_hours else 'Не сегодня'}\n"
+            f"• *Опубликовано:* {metrics['published_photo']} с изображением, "
+            f"{metrics['published_cached']} из кэша, {metrics['published_text']} текстом, "
+            f"пропущено: {metrics['skipped_deadline']}, ошибок: {metrics['failed']}\n"
+            f"• *Задержка p50/p99:* {latency_p50:.1f}/{latency_p99:.1f} с "
+            f"из {calendar.slot_budget:.0f} с, сверх бюджета: {metrics['over_budget']}\n"
+            f"• *Последняя публикация:* {metrics['last_published'] or '-'}\n"
+            f"{check_results}"
+        )
     
-    # Проверяем наличие файла на сегодня
-    filename = f"{POSTS_DIR}/{now.day:02d}-{now.month:02d}.txt"
-    file_exists = os.path.exists(filename)
+    # Нагрузка на планировщик работы
+    work = work_scheduler.stats()
+    work_results = (
+        f"• Публикаций по расписанию: {work['scheduled_admitted']}\n"
+        f"• Команд принято: {work['interactive_admitted']}, "
+        f"отклонено: {work['rejected_queue_full']} (очередь) / {work['rejected_rate_limited']} (лимит)\n"
+        f"• В очереди: {work['interactive_waiting']}, выполняется: {work['interactive_running']}\n"
+        f"• Ожидание в очереди p50/p99: {work['wait_p50'] * 1000:.0f}/{work['wait_p99'] * 1000:.0f} мс"
+    )
     
+    calendars_text = "\n\n".join(calendar_results)
     status_text = (
         f"ߓʠ*Статус бота*\n\n"
         f"• *Время:* {now.strftime('%H:%M:%S')}\n"
         f"• *Дата:* {now.strftime('%d.%m.%Y')}\n"
         f"• *Час МСК:* {moscow_hour}\n"
-        f"• *Файл на сегодня:* {'✅' if file_exists else '❌'} {filename}\n"
-        f"• *Следующий пост:* {'Скоро' if moscow_hour in POST_HOURS else 'Не сегодня'}\n\n"
-        f"*Проверка файлов:*\n{check_results}\n\n"
+        f"• *Рендеринг:* {'сервис ' + RENDER_SERVICE_URL if render_client else 'в процессе'}\n\n"
+        f"*Календари:*\n{calendars_text}\n\n"
+        f"*Очередь команд:*\n{work_results}\n\n"
         f"_Бот работает в режиме MarkdownV2 с генерацией изображений_"
     )
     
@@ -556,9 +879,145 @@ async def cmd_status(update, context):
         parse_mode="MarkdownV2"
     )
 
+async def cmd_profile(update, context):
+    """
+    Команда /profile N [sampling|cprofile] [memory] - профилировать следующие N
+    заданий по расписанию или команд; /profile off - отменить; /profile - состояние.
+    Доступна только пользователям из ADMIN_IDS.
+    """
+    user_id = update.effective_user.id if update.effective_user else None
+    if user_id not in ADMIN_IDS:
+        await update.message.reply_text("⛔ Команда доступна только администраторам")
+        return
+    
+    args = [arg.lower() for arg in context.args or []]
+    usage = "Использование: /profile N [sampling|cprofile] [memory] или /profile off"
+    if args == ["off"]:
+        profiler.disarm()
+        await update.message.reply_text("🔬 Профилирование отменено")
+        return
+    
+    if args:
+        try:
+            runs = int(args[0])
+            options = set(args[1:])
+            modes = options & {"sampling", "cprofile"}
+            if len(modes) > 1 or options - modes - {"memory"}:
+                raise ValueError(options)
+            profiler.arm(runs, modes.pop() if modes else PROFILE_MODE, "memory" in options)
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+    
+    status = profiler.status()
+    completed = "\n".join(f"• {path}" for path in status["completed"]) or "• -"
+    await update.message.reply_text(
+        f"🔬 Профилирование: осталось {status['remaining']} выполн., режим {status['mode']}"
+        f"{', память' if status['memory'] else ''}\n"
+        f"Сейчас профилируется: {status['active'] or '-'}\n"
+        f"Последние результаты ({os.path.abspath(PROFILE_DIR)}):\n{completed}"
+    )
+
+# ==================== ПРОГРЕВ ====================
+def warm_render_assets(calendars: list) -> str:
+    """
+    Прогревает рендеринг: проверяет сервис рендеринга или, без него,
+    декодирует фоны и строит атласы глифов календарей в этом процессе.
+    
+    Returns:
+        Чем рисуются карточки (для лога)
+    """
+    if render_client:
+        try:
+            render_client.health()
+            return f"сервис {RENDER_SERVICE_URL}"
+        except OSError as e:
+            # Без сервиса карточки рисуются в процессе - прогреваем его
+            logger.warning(f"⚠️ Сервис рендеринга недоступен ({e}), прогреваем рендеринг в процессе")
+    for calendar in calendars:
+        image_generator.warm_up(calendar.background_file, calendar.font_file, [calendar.template])
+    return "в процессе"
+
+async def warm_posts(calendars: list) -> int:
+    """
+    Загружает посты сегодняшних слотов всех календарей в кэш post_flight.
+    
+    Returns:
+        Сколько слотов с постами найдено
+    """
+    now = datetime.now()
+    posts = await asyncio.gather(*(
+        get_slot_post(calendar, now.day, now.month, hour)
+        for calendar in calendars
+        if os.path.exists(calendar.post_filename(now.day, now.month))
+        for hour in calendar.post_hours
+    ))
+    return sum(1 for post in posts if post)
+
+# ==================== СБОРКА ПРИЛОЖЕНИЯ ====================
+def build_application(token: str, base_url: str = None, calendars: list = None,
+                      post_init=None) -> "Application":
+    """
+    Создает приложение с зарегистрированными командами и расписанием.
+    
+    Args:
+        token: Токен бота
+        base_url: Адрес Bot API (например, локальный фейковый сервер
+            из fake_bot_api.py); по умолчанию - api.telegram.org
+        calendars: Обслуживаемые календари; по умолчанию - get_calendars()
+        post_init: Корутина post_init(app) - выполняется в run_polling после
+            подключения к Bot API и до начала опроса
+        
+    Returns:
+        Готовое к запуску приложение
+    """
+    from telegram.ext import Application, CommandHandler
+    
+    # Команды обрабатываются параллельно, их число ограничивает work_scheduler;
+    # пул соединений расширен, иначе параллельные ответы упираются в PoolTimeout
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(True)
+        .connection_pool_size(HTTP_POOL_SIZE)
+        .pool_timeout(HTTP_POOL_TIMEOUT)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if post_init:
+        builder = builder.post_init(post_init)
+    app = builder.build()
+    app.bot_data["calendars"] = calendars or get_calendars()
+    
+    # Регистрация команд
+    app.add_handler(CommandHandler("start", interactive_command(cmd_start)))
+    app.add_handler(CommandHandler("test", interactive_command(cmd_test)))
+    app.add_handler(CommandHandler("preview", interactive_command(cmd_preview)))
+    app.add_handler(CommandHandler("status", interactive_command(cmd_status)))
+    app.add_handler(CommandHandler("profile", interactive_command(cmd_profile, profiled=False)))
+    logger.info("✅ Команды зарегистрированы")
+    
+    # Профилирование первых заданий/команд после запуска
+    if PROFILE_NEXT:
+        profiler.arm(PROFILE_NEXT, PROFILE_MODE, PROFILE_MEMORY)
+    
+    # Настройка расписания: у каждого календаря свои часы
+    for calendar in app.bot_data["calendars"]:
+        for hour_msk in calendar.post_hours:
+            utc_hour = (hour_msk - 3) % 24
+            app.job_queue.run_daily(
+                scheduled_job(send_scheduled_post),
+                time(hour=utc_hour, minute=0, second=10),
+                name=calendar.job_name(hour_msk),
+                data=calendar
+            )
+    
+    return app
+
 # ==================== ЗАПУСК БОТА ====================
 def main():
     """Основная функция запуска бота"""
+    timer = StartupTimer()
     
     # Проверка обязательных переменных
     if not BOT_TOKEN:
@@ -566,64 +1025,111 @@ def main():
         logger.error("Задайте переменную окружения: export BOT_TOKEN='ваш_токен'")
         return
     
-    if not CHANNEL:
+    if not CALENDARS_CONFIG and not CHANNEL:
         logger.error("❌ ОШИБКА: CHANNEL не задан!")
         return
     
-    # Создаем необходимые директории
-    directories = [POSTS_DIR, ASSETS_DIR, FONTS_DIR, GENERATED_DIR]
-    for directory in directories:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-            logger.info(f"ߓ`Создана директория: {directory}")
+    # Загружаем календари
+    with timer.phase("календари"):
+        try:
+            calendars = get_calendars()
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ ОШИБКА в конфигурации календарей {CALENDARS_CONFIG}: {e}")
+            return
     
-    # Проверяем наличие критических файлов
-    if not os.path.exists(BACKGROUND_FILE):
-        logger.warning(f"⚠️ Фоновое изображение не найдено: {BACKGROUND_FILE}")
-        logger.warning("Поместите файл fon.jpg (1600x1124) в папку assets/")
+    # Эндпоинт поднимается сразу: живость видна с первых миллисекунд,
+    # готовность - после прогрева постов, рендеринга и Bot API (post_init ниже)
+    health = None
+    if HEALTH_PORT:
+        try:
+            health = HealthServer(("posts", "render", "bot_api"), timer, HEALTH_HOST, HEALTH_PORT).start()
+        except OSError as e:
+            logger.error(f"❌ Не удалось запустить эндпоинт готовности {HEALTH_HOST}:{HEALTH_PORT}: {e}")
     
-    if not os.path.exists(FONT_FILE):
-        logger.warning(f"⚠️ Шрифт не найден: {FONT_FILE}")
-        logger.warning("Поместите файл GOST_A.TTF в папку fonts/")
+    with timer.phase("директории и файлы"):
+        # Создаем необходимые директории
+        directories = [ASSETS_DIR, FONTS_DIR]
+        for calendar in calendars:
+            directories += [calendar.posts_dir, calendar.generated_dir]
+        for directory in directories:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+                logger.info(f"ߓ`Создана директория: {directory}")
+    
+        # Проверяем наличие критических файлов
+        for calendar in calendars:
+            if not os.path.exists(calendar.background_file):
+                logger.warning(f"⚠️ [{calendar.name}] Фоновое изображение не найдено: {calendar.background_file}")
+                logger.warning("Поместите файл fon.jpg (1600x1124) в папку assets/")
+        
+            if not os.path.exists(calendar.font_file):
+                logger.warning(f"⚠️ [{calendar.name}] Шрифт не найден: {calendar.font_file}")
+                logger.warning("Поместите файл GOST_A.TTF в папку fonts/")
+    
+    # Фоны и атласы прогреваются в пуле рендеринга параллельно с импортом
+    # python-telegram-bot и подключением к Bot API
+    def warm_render():
+        with timer.phase("прогрев рендеринга"):
+            return warm_render_assets(calendars)
+    
+    render_warm = render_executor.submit(warm_render)
+    
+    async def post_init(app):
+        # initialize() уже выполнил getMe: соединение с Bot API установлено
+        timer.record("подключение к Bot API", timer.elapsed() - polling_started)
+        if health:
+            health.mark("bot_api")
+        
+        with timer.phase("индекс постов"):
+            found = await warm_posts(calendars)
+        if health:
+            health.mark("posts")
+        
+        try:
+            render_mode = await asyncio.wrap_future(render_warm)
+        except Exception as e:
+            # Бот работает (карточки нарисуются при публикации), но готовым не считается
+            logger.error(f"❌ Ошибка прогрева рендеринга: {e}", exc_info=True)
+            render_mode = "не прогрет"
+        else:
+            if health:
+                health.mark("render")
+        
+        logger.info(f"✅ @{app.bot.username} готов: постов на сегодня {found}, рендеринг {render_mode}")
+        logger.info(f"⏱ Запуск: {timer.report()}")
     
     # Инициализация приложения
     try:
-        app = Application.builder().token(BOT_TOKEN).build()
+        with timer.phase("импорт telegram"):
+            importlib.import_module("telegram.ext")
+        with timer.phase("сборка приложения"):
+            app = build_application(BOT_TOKEN, calendars=calendars, post_init=post_init)
         logger.info("✅ Приложение инициализировано")
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации бота: {e}")
         return
     
-    # Регистрация команд
-    app.add_handler(CommandHandler("start", cmd_start))
-    app.add_handler(CommandHandler("test", cmd_test))
-    app.add_handler(CommandHandler("status", cmd_status))
-    logger.info("✅ Команды зарегистрированы")
-    
-    # Настройка расписания
-    job_added = 0
-    for hour_msk in POST_HOURS:
-        utc_hour = (hour_msk - 3) % 24
-        app.job_queue.run_daily(
-            send_scheduled_post,
-            time(hour=utc_hour, minute=0, second=10),
-            name=f"post_{hour_msk:02d}"
-        )
-        job_added += 1
-    
+    job_added = sum(len(calendar.post_hours) for calendar in calendars)
     logger.info(f"✅ Настроено {job_added} заданий по расписанию")
-    logger.info(f"ߓ Бот будет публиковать в канал: {CHANNEL}")
-    logger.info(f"ߕРЧасы публикации (МСК): {POST_HOURS}")
+    for calendar in calendars:
+        logger.info(f"ߓ [{calendar.name}] Бот будет публиковать в канал: {calendar.channel}")
+        logger.info(f"ߕР[{calendar.name}] Часы публикации (МСК): {calendar.post_hours}")
     logger.info("ߎȠРежим: генерация изображений + MarkdownV2")
+    if render_client:
+        logger.info(f"🖼 Карточки рисует сервис рендеринга: {RENDER_SERVICE_URL}")
     logger.info("=" * 50)
     
     # Запуск бота
+    polling_started = timer.elapsed()
     try:
         app.run_polling(drop_pending_updates=True)
     except KeyboardInterrupt:
         logger.info("⏹️ Бот остановлен пользователем")
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}", exc_info=True)
+    finally:
+        if health:
+            health.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Календари, которые обслуживает один процесс бота.
+
+Каждый календарь - своя папка с постами, фон, шрифт, канал и часы
+публикации. Все календари процесса делят один бот (и пул HTTP-соединений),
+один пул рендеринга и кэш фонов/атласов глифов; расписание и метрики у
+каждого свои.
+
+Файл конфигурации (JSON, путь в CALENDARS_CONFIG):
+    {
+      "calendars": [
+        {"name": "narodny", "channel": "@narodny_kalendar", "posts_dir": "posts"},
+        {"name": "church", "channel": "@church_kalendar", "posts_dir": "posts_church",
+         "background_file": "assets/church.jpg", "post_hours": [7, 12, 19],
+         "slot_budget": 60, "template": "classic"}
+      ]
+    }
+Незаданные поля берутся из переменных окружения / констант bot.py.
+"""
+
+import json
+import os
+import re
+from collections import deque
+
+# Поля календаря, которые можно задать в конфигурации
+CALENDAR_FIELDS = (
+    "name", "channel", "posts_dir", "background_file",
+    "font_file", "post_hours", "generated_dir", "slot_budget", "template",
+)
+
+class Calendar:
+    """
+    Настройки и метрики одного календаря.
+    """
+
+    def __init__(self, name: str, channel: str, posts_dir: str, background_file: str,
+                 font_file: str, post_hours: list, generated_dir: str, slot_budget: float,
+                 template: str):
+        self.name = name
+        self.channel = channel
+        self.posts_dir = posts_dir
+        self.background_file = background_file
+        self.font_file = font_file
+        self.post_hours = sorted(set(int(hour) for hour in post_hours))
+        self.generated_dir = generated_dir
+        self.slot_budget = float(slot_budget)  # бюджет задержки слота, секунды
+        self.template = template                # шаблон карточки (image_generator.TEMPLATES)
+        self.metrics = {
+            "published_photo": 0,
+            "published_cached": 0,  # фото из кэша: свежая карточка не успела
+            "published_text": 0,
+            "no_content": 0,
+            "skipped_deadline": 0,  # не уложились в бюджет ни одним способом
+            "over_budget": 0,
+            "failed": 0,
+            "last_published": None,
+        }
+        # Достигнутая задержка последних слотов с контентом, секунды
+        self.latencies = deque(maxlen=500)
+
+    def job_name(self, hour: int) -> str:
+        """Имя задания в JobQueue для часа публикации."""
+        return f"{self.name}:post_{hour:02d}"
+
+    def post_filename(self, day: int, month: int) -> str:
+        """Файл с постами на дату."""
+        return f"{self.posts_dir}/{day:02d}-{month:02d}.txt"
+
+    def __repr__(self):
+        return f"Calendar({self.name!r}, channel={self.channel!r}, posts_dir={self.posts_dir!r})"
+
+def validate_post_hours(name: str, post_hours):
+    """
+    Часы публикации - непустой список целых часов МСК от 0 до 23: задание
+    на час 24 и больше запускалось бы, но не находило свой слот.
+
+    Raises:
+        ValueError: часы заданы неверно
+    """
+    if not isinstance(post_hours, list) or not post_hours:
+        raise ValueError(f"Календарь {name!r}: post_hours должен быть непустым списком часов")
+    for hour in post_hours:
+        if isinstance(hour, bool) or not isinstance(hour, int) or not 0 <= hour <= 23:
+            raise ValueError(f"Календарь {name!r}: недопустимый час публикации {hour!r} (нужно 0..23)")
+
+def load_calendars(path: str, defaults: dict) -> list:
+    """
+    Загружает календари из JSON-файла.
+
+    Args:
+        path: Путь к файлу конфигурации
+        defaults: Значения полей по умолчанию (из констант бота)
+
+    Returns:
+        Список календарей в порядке файла
+
+    Raises:
+        ValueError: ошибка в конфигурации
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    entries = config.get("calendars") if isinstance(config, dict) else None
+    if not entries or not isinstance(entries, list):
+        raise ValueError(f"В {path} нет списка calendars")
+
+    calendars = []
+    names = set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Календарь #{index + 1}: ожидался объект, а не {type(entry).__name__}")
+        unknown = set(entry) - set(CALENDAR_FIELDS)
+        if unknown:
+            raise ValueError(f"Календарь #{index + 1}: неизвестные поля {sorted(unknown)}")
+
+        name = str(entry.get("name") or f"calendar{index + 1}")
+        if not re.fullmatch(r"[\w-]+", name):
+            raise ValueError(f"Недопустимое имя календаря: {name!r}")
+        if name in names:
+            raise ValueError(f"Календарь {name!r} указан дважды")
+        names.add(name)
+
+        fields = dict(defaults)
+        fields.update(entry)
+        fields["name"] = name
+        if "generated_dir" not in entry:
+            # У каждого календаря свои картинки, иначе post_ДД_ММ_ЧЧ.jpg пересекутся
+            fields["generated_dir"] = os.path.join(defaults["generated_dir"], name)
+        if not fields.get("channel"):
+            raise ValueError(f"Календарь {name!r}: не задан channel")
+        for key in ("channel", "posts_dir", "background_file", "font_file", "generated_dir", "template"):
+            if not isinstance(fields[key], str):
+                raise ValueError(f"Календарь {name!r}: {key} должен быть строкой")
+        validate_post_hours(name, fields["post_hours"])
+        slot_budget = fields["slot_budget"]
+        if isinstance(slot_budget, bool) or not isinstance(slot_budget, (int, float)) or slot_budget <= 0:
+            raise ValueError(f"Календарь {name!r}: slot_budget должен быть положительным числом")
+
+        calendars.append(Calendar(**{key: fields[key] for key in CALENDAR_FIELDS}))
+
+    return calendars
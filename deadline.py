@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бюджет задержки слота публикации.
+
+У каждого слота есть бюджет (секунды от запуска задания). Этапы публикации
+получают свою долю бюджета: рендеринг - до render_share, отправка фото -
+до photo_share, отправка текста - до конца бюджета. Этап, не уложившийся
+в свой срок, отменяется, и публикация деградирует к следующему варианту:
+свежая карточка -> карточка из кэша -> только текст -> пропуск с оповещением.
+
+Длительность каждого этапа записывается, чтобы в логах и /status было
+видно, на что ушел бюджет.
+"""
+
+import asyncio
+import time
+
+class SlotDeadline:
+    """
+    Сроки этапов одного слота.
+    """
+
+    def __init__(self, budget: float, render_share: float = 0.5, photo_share: float = 0.75):
+        """
+        Args:
+            budget: Бюджет слота, секунды
+            render_share: Доля бюджета, к концу которой должен закончиться рендеринг
+            photo_share: Доля бюджета, к концу которой должно уйти фото
+        """
+        self.budget = budget
+        self.render_share = render_share
+        self.photo_share = photo_share
+        self.started = time.monotonic()
+        self.stages = {}  # этап -> длительность, с (или "timeout")
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self, share: float = 1.0) -> float:
+        """Сколько секунд осталось до доли share бюджета (не меньше нуля)."""
+        return max(0.0, self.budget * share - self.elapsed())
+
+    async def stage(self, name: str, awaitable, share: float = 1.0):
+        """
+        Выполняет этап со сроком до доли share бюджета.
+
+        Raises:
+            asyncio.TimeoutError: этап не уложился и отменен
+        """
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(awaitable, timeout=self.remaining(share))
+        except asyncio.TimeoutError:
+            self.stages[name] = "timeout"
+            raise
+        self.stages[name] = time.monotonic() - started
+        return result
+
+    def summary(self) -> str:
+        """Этапы для лога: "render 0.31 с, photo timeout"."""
+        return ", ".join(
+            f"{name} {value:.2f} с" if isinstance(value, float) else f"{name} {value}"
+            for name, value in self.stages.items()
+        )
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Потоковый инкрементальный экспорт календаря для сайта и читалок лент.
+
+Посты читаются по одному дню и проходят через генераторы, поэтому память
+не зависит от размера корпуса. Результат в папке экспорта:
+    posts.jsonl          - пост на строку (дата, час, тема, текст, карточка)
+    rss.xml, atom.xml    - ленты RSS 2.0 и Atom
+    index.html           - список дней
+    days/ДД-ММ.html      - страница дня
+    images/              - карточки из кэша рендеринга (GENERATED_DIR календаря)
+    manifest.json        - хэши содержимого дней
+
+Каждый день сначала пишется во фрагменты (.fragments/ДД-ММ.*), а общие
+файлы собираются потоковым копированием фрагментов. День перегенерируется,
+только если изменился его хэш: текст файла, карточки (размер и время
+изменения) и настройки экспорта.
+
+Пример:
+    python export.py --output export --base-url https://example.org/kalendar
+    python export.py --calendar evening --render   # дорисовать недостающие карточки
+"""
+
+import argparse
+import calendar as calendar_module
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape as xml_escape
+
+import bot
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении формата экспорта - тогда перегенерируются все дни
+EXPORT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+FRAGMENTS_DIR = ".fragments"
+FRAGMENT_KINDS = ("jsonl", "rss", "atom", "index")
+
+MSK = timezone(timedelta(hours=3))
+
+MONTHS_GENITIVE = [
+    "января", "февраля", "марта", "апреля", "мая", "июня",
+    "июля", "августа", "сентября", "октября", "ноября", "декабря"
+]
+
+# ==================== ЧТЕНИЕ КОРПУСА ====================
+def iter_day_files(posts_dir: str):
+    """
+    Файлы дней в порядке календаря.
+
+    Yields:
+        Кортежи (день, месяц, путь к файлу)
+    """
+    days = []
+    for filename in os.listdir(posts_dir):
+        match = re.fullmatch(r"(\d{2})-(\d{2})\.txt", filename)
+        if match:
+            day, month = int(match.group(1)), int(match.group(2))
+            days.append((month, day, filename))
+    for month, day, filename in sorted(days):
+        yield day, month, os.path.join(posts_dir, filename)
+
+def post_datetime(year: int, month: int, day: int, hour: int) -> datetime:
+    """Время публикации по МСК; 29 февраля невисокосного года - ближайший високосный год раньше."""
+    if (month, day) == (2, 29):
+        while not calendar_module.isleap(year):
+            year -= 1
+    return datetime(year, month, day, hour, tzinfo=MSK)
+
+def iter_day_posts(cal, day: int, month: int, filename: str, year: int, render: bool = False):
+    """
+    Посты одного дня по часам.
+
+    Args:
+        cal: Календарь (bot.Calendar)
+        render: Дорисовать карточки, которых нет в кэше или которые устарели
+
+    Yields:
+        Словари с полями поста; "image_file" - карточка этой темы или None
+        (карточка, нарисованная для другой темы или другого фона, не берется)
+    """
+    for hour, text in sorted(bot.parse_post_file(filename).items()):
+        if not text.strip():
+            continue
+        theme = bot.extract_theme_from_post(text)
+        image_file = bot.cached_slot_image(cal, theme, day, month, hour)
+        if image_file is None and render:
+            image_file = bot.render_slot_card(cal, theme, day, month, hour)
+        yield {
+            "date": f"{day:02d}-{month:02d}",
+            "day": day,
+            "month": month,
+            "hour": hour,
+            "published": post_datetime(year, month, day, hour).isoformat(),
+            "theme": theme,
+            "text": text,
+            "image_file": image_file,
+        }
+
+def day_hash(filename: str, posts: list, settings: dict) -> str:
+    """
+    Хэш содержимого дня: текст файла, карточки и настройки экспорта.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    for post in posts:
+        if post["image_file"]:
+            stat = os.stat(post["image_file"])
+            digest.update(f"{post['hour']}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+# ==================== ФОРМАТЫ ====================
+# Символ адреса в уже экранированном тексте: адрес обрывается на пробеле и на
+# экранированных кавычках и угловых скобках
+URL_CHARS = r"(?:(?!&quot;|&#x27;|&lt;|&gt;)[^\s<>\"'])"
+
+def markdown_to_html(text: str) -> str:
+    """
+    Разметка постов (*жирный*, _курсив_, __подчеркивание__, [ссылки](url), `код`,
+    [b]/[i]) в HTML; остальной текст экранируется, переводы строк сохраняются.
+    """
+    # Кавычки экранируются тоже: адрес ссылки попадает в атрибут href
+    result = html.escape(text, quote=True)
+    result = re.sub(r"`([^`\n]+)`", r"<code>\1</code>", result)
+    result = re.sub(rf"\[([^\]\n]+)\]\((https?://{URL_CHARS}+?)\)", r'<a href="\2">\1</a>', result)
+    result = re.sub(rf'(?<![\w"/>])(https?://{URL_CHARS}+)', r'<a href="\1">\1</a>', result)
+    result = re.sub(r"\*\*([^*\n]+)\*\*", r"<b>\1</b>", result)
+    result = re.sub(r"\*([^*\n]+)\*", r"<b>\1</b>", result)
+    result = re.sub(r"(?<!\w)__([^_\n]+)__(?!\w)", r"<u>\1</u>", result)
+    result = re.sub(r"(?<!\w)_([^_\n]+)_(?!\w)", r"<i>\1</i>", result)
+    # В части постов встречаются BB-теги
+    result = re.sub(r"\[(/?)([bi])\]", r"<\1\2>", result)
+    result = re.sub(r"\[/?list\]", "", result)
+    return result.replace("\n", "<br>\n")
+
+def xml_attr(value: str) -> str:
+    """Значение XML-атрибута в двойных кавычках."""
+    return xml_escape(value, {'"': "&quot;"})
+
+def day_title(day: int, month: int) -> str:
+    return f"{day} {MONTHS_GENITIVE[month - 1]}"
+
+def image_url(post: dict, base_url: str) -> str:
+    """Адрес карточки в экспорте (абсолютный, если задан base_url)."""
+    if not post["image_file"]:
+        return None
+    relative = f"images/{os.path.basename(post['image_file'])}"
+    return f"{base_url}/{relative}" if base_url else relative
+
+def page_url(post: dict, base_url: str) -> str:
+    relative = f"days/{post['date']}.html#h{post['hour']:02d}"
+    return f"{base_url}/{relative}" if base_url else relative
+
+def jsonl_line(post: dict, base_url: str) -> str:
+    record = {key: post[key] for key in ("date", "day", "month", "hour", "published", "theme", "text")}
+    record["image"] = image_url(post, base_url)
+    record["url"] = page_url(post, base_url)
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def rss_item(post: dict, base_url: str) -> str:
+    published = datetime.fromisoformat(post["published"])
+    enclosure = ""
+    if post["image_file"]:
+        enclosure = (f'<enclosure url="{xml_attr(image_url(post, base_url))}" '
+                     f'length="{os.path.getsize(post["image_file"])}" type="image/jpeg"/>')
+    return (
+        "<item>"
+        f"<title>{xml_escape(post['theme'])}</title>"
+        f"<link>{xml_escape(page_url(post, base_url))}</link>"
+        f"<guid isPermaLink=\"false\">{xml_escape(post['date'])}-{post['hour']:02d}</guid>"
+        f"<pubDate>{published.strftime('%a, %d %b %Y %H:%M:%S %z')}</pubDate>"
+        f"<description>{xml_escape(markdown_to_html(post['text']))}</description>"
+        f"{enclosure}"
+        "</item>\n"
+    )
+
+def atom_entry(post: dict, base_url: str) -> str:
+    link = xml_attr(page_url(post, base_url))
+    enclosure = ""
+    if post["image_file"]:
+        enclosure = (f'<link rel="enclosure" type="image/jpeg" '
+                     f'href="{xml_attr(image_url(post, base_url))}"/>')
+    return (
+        "<entry>"
+        f"<title>{xml_escape(post['theme'])}</title>"
+        f'<link href="{link}"/>'
+        f"<id>{link}</id>"
+        f"<updated>{post['published']}</updated>"
+        f'<content type="html">{xml_escape(markdown_to_html(post["text"]))}</content>'
+        f"{enclosure}"
+        "</entry>\n"
+    )
+
+def html_article(post: dict) -> str:
+    image = ""
+    if post["image_file"]:
+        image = (f'<img src="../images/{html.escape(os.path.basename(post["image_file"]))}" '
+                 f'alt="{html.escape(post["theme"])}" loading="lazy">\n')
+    return (
+        f'<article id="h{post["hour"]:02d}">\n'
+        f'<h2>{post["hour"]:02d}:00 · {html.escape(post["theme"])}</h2>\n'
+        f"{image}"
+        f"<p>{markdown_to_html(post['text'])}</p>\n"
+        "</article>\n"
+    )
+
+def html_page(title: str, body: str) -> str:
+    return (
+        "<!DOCTYPE html>\n"
+        '<html lang="ru">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>{html.escape(title)}</title>\n</head>\n<body>\n"
+        f"{body}"
+        "</body>\n</html>\n"
+    )
+
+# ==================== ЗАПИСЬ ====================
+def write_atomic(path: str, chunks):
+    """
+    Записывает файл из потока строк через временный файл.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, path)
+
+def fragment_path(output_dir: str, date: str, kind: str) -> str:
+    return os.path.join(output_dir, FRAGMENTS_DIR, f"{date}.{kind}")
+
+def export_day(output_dir: str, day: int, month: int, posts: list, base_url: str):
+    """
+    Перегенерирует фрагменты, страницу и карточки одного дня.
+    """
+    date = f"{day:02d}-{month:02d}"
+    write_atomic(fragment_path(output_dir, date, "jsonl"), (jsonl_line(post, base_url) for post in posts))
+    write_atomic(fragment_path(output_dir, date, "rss"), (rss_item(post, base_url) for post in posts))
+    write_atomic(fragment_path(output_dir, date, "atom"), (atom_entry(post, base_url) for post in posts))
+    themes = "; ".join(html.escape(post["theme"]) for post in posts)
+    write_atomic(fragment_path(output_dir, date, "index"), [
+        f'<li><a href="days/{date}.html">{day_title(day, month)}</a> - {themes}</li>\n'
+    ])
+
+    title = day_title(day, month)
+    write_atomic(os.path.join(output_dir, "days", f"{date}.html"), [html_page(title, "".join([
+        f"<h1>{title}</h1>\n",
+        *(html_article(post) for post in posts),
+        '<p><a href="../index.html">Все дни</a></p>\n',
+    ]))])
+
+    # Карточки дня: копируем актуальные и удаляем прежние копии, которых больше
+    # нет (час убран из файла или карточка устарела и не перерисована)
+    images_dir = os.path.join(output_dir, "images")
+    current = set()
+    for post in posts:
+        if post["image_file"]:
+            current.add(os.path.basename(post["image_file"]))
+            shutil.copy2(post["image_file"], os.path.join(images_dir, os.path.basename(post["image_file"])))
+    prefix = f"post_{date.replace('-', '_')}_"
+    for filename in os.listdir(images_dir):
+        if filename.startswith(prefix) and filename not in current:
+            os.remove(os.path.join(images_dir, filename))
+
+def remove_day(output_dir: str, date: str):
+    """Удаляет результаты дня, которого больше нет в корпусе."""
+    paths = [fragment_path(output_dir, date, kind) for kind in FRAGMENT_KINDS]
+    paths.append(os.path.join(output_dir, "days", f"{date}.html"))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    images_dir = os.path.join(output_dir, "images")
+    prefix = f"post_{date.replace('-', '_')}_"
+    for filename in os.listdir(images_dir):
+        if filename.startswith(prefix):
+            os.remove(os.path.join(images_dir, filename))
+
+def iter_fragments(output_dir: str, dates: list, kind: str):
+    """Содержимое фрагментов дней кусками (без чтения файлов целиком)."""
+    for date in dates:
+        with open(fragment_path(output_dir, date, kind), "r", encoding="utf-8") as f:
+            for chunk in iter(lambda: f.read(65536), ""):
+                yield chunk
+
+def assemble(output_dir: str, dates: list, cal, base_url: str):
+    """
+    Собирает общие файлы из фрагментов дней потоковым копированием.
+    """
+    title = f"Народный календарь: {cal.name}"
+    link = base_url or "index.html"
+    updated = datetime.now(MSK)
+
+    write_atomic(os.path.join(output_dir, "posts.jsonl"), iter_fragments(output_dir, dates, "jsonl"))
+
+    write_atomic(os.path.join(output_dir, "rss.xml"), [
+        '<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0">\n<channel>\n',
+        f"<title>{xml_escape(title)}</title>\n<link>{xml_escape(link)}</link>\n",
+        f"<description>{xml_escape(title)} - посты канала {xml_escape(cal.channel)}</description>\n",
+        "<language>ru</language>\n",
+        f"<lastBuildDate>{updated.strftime('%a, %d %b %Y %H:%M:%S %z')}</lastBuildDate>\n",
+        *iter_fragments(output_dir, dates, "rss"),
+        "</channel>\n</rss>\n",
+    ])
+
+    write_atomic(os.path.join(output_dir, "atom.xml"), [
+        '<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n',
+        f"<title>{xml_escape(title)}</title>\n",
+        f'<link href="{xml_attr(link)}"/>\n<id>{xml_escape(base_url or cal.channel)}</id>\n',
+        f"<updated>{updated.isoformat(timespec='seconds')}</updated>\n",
+        f"<author><name>{xml_escape(cal.channel)}</name></author>\n",
+        *iter_fragments(output_dir, dates, "atom"),
+        "</feed>\n",
+    ])
+
+    write_atomic(os.path.join(output_dir, "index.html"), [
+        "<!DOCTYPE html>\n",
+        '<html lang="ru">\n<head>\n<meta charset="utf-8">\n',
+        f"<title>{html.escape(title)}</title>\n",
+        '<link rel="alternate" type="application/rss+xml" href="rss.xml">\n',
+        '<link rel="alternate" type="application/atom+xml" href="atom.xml">\n',
+        f"</head>\n<body>\n<h1>{html.escape(title)}</h1>\n<ul>\n",
+        *iter_fragments(output_dir, dates, "index"),
+        "</ul>\n</body>\n</html>\n",
+    ])
+
+def export_calendar(cal, output_dir: str, base_url: str = "", year: int = None,
+                    render: bool = False, force: bool = False) -> dict:
+    """
+    Экспортирует календарь, перегенерируя только изменившиеся дни.
+
+    Args:
+        cal: Календарь (bot.Calendar)
+        output_dir: Папка экспорта
+        base_url: Адрес сайта, на котором будет опубликована папка (для лент)
+        year: Год для дат публикаций (по умолчанию - текущий)
+        render: Дорисовать карточки, которых нет в кэше
+        force: Перегенерировать все дни
+
+    Returns:
+        Счетчики: days, posts, regenerated, unchanged, removed
+    """
+    base_url = base_url.rstrip("/")
+    year = year or datetime.now().year
+    for directory in (output_dir, os.path.join(output_dir, FRAGMENTS_DIR),
+                      os.path.join(output_dir, "days"), os.path.join(output_dir, "images")):
+        os.makedirs(directory, exist_ok=True)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {}
+    # Прежний манифест читается и с force: по нему удаляются пропавшие дни
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    old_days = manifest.get("days", {})
+    settings = {"version": EXPORT_VERSION, "base_url": base_url, "year": year, "calendar": cal.name}
+
+    stats = {"days": 0, "posts": 0, "regenerated": 0, "unchanged": 0, "removed": 0}
+    days = {}
+    for day, month, filename in iter_day_files(cal.posts_dir):
+        # В памяти только посты текущего дня
+        posts = list(iter_day_posts(cal, day, month, filename, year, render))
+        date = f"{day:02d}-{month:02d}"
+        digest = day_hash(filename, posts, settings)
+        days[date] = digest
+        stats["days"] += 1
+        stats["posts"] += len(posts)
+        if (not force and old_days.get(date) == digest
+                and os.path.exists(fragment_path(output_dir, date, "jsonl"))):
+            stats["unchanged"] += 1
+            continue
+        export_day(output_dir, day, month, posts, base_url)
+        stats["regenerated"] += 1
+        logger.info(f"📝 [{cal.name}] Экспортирован день {date}: постов {len(posts)}")
+
+    for date in set(old_days) - set(days):
+        remove_day(output_dir, date)
+        stats["removed"] += 1
+        logger.info(f"🗑 [{cal.name}] День {date} удален из экспорта")
+
+    # Порядок словаря совпадает с порядком дней календаря
+    assemble(output_dir, list(days), cal, base_url)
+
+    write_atomic(manifest_path, [json.dumps({"settings": settings, "days": days}, ensure_ascii=False, indent=1)])
+    return stats
+
+# ==================== ЗАПУСК ====================
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт календаря в JSONL, RSS/Atom и HTML")
+    parser.add_argument("--output", default="export", help="Папка экспорта")
+    parser.add_argument("--calendar", default=None, help="Имя календаря (по умолчанию - первый)")
+    parser.add_argument("--base-url", default="", help="Адрес, по которому будет опубликована папка")
+    parser.add_argument("--year", type=int, default=None, help="Год для дат публикаций")
+    parser.add_argument("--render", action="store_true", help="Дорисовать недостающие карточки")
+    parser.add_argument("--force", action="store_true", help="Перегенерировать все дни")
+    args = parser.parse_args()
+
+    calendars = bot.get_calendars()
+    if args.calendar:
+        calendars = [cal for cal in calendars if cal.name == args.calendar]
+        if not calendars:
+            print(f"❌ Календарь {args.calendar!r} не найден")
+            sys.exit(1)
+
+    stats = export_calendar(calendars[0], args.output, args.base_url, args.year, args.render, args.force)
+    print(f"✅ Экспорт в {args.output}: дней {stats['days']}, постов {stats['posts']}, "
+          f"перегенерировано {stats['regenerated']}, без изменений {stats['unchanged']}, "
+          f"удалено {stats['removed']}")
+
+if __name__ == "__main__":
+    main()
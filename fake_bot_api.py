@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальный фейковый сервер Telegram Bot API для нагрузочных проверок.
+Поддерживает getMe, getUpdates, sendMessage, sendPhoto (+ служебные
+deleteWebhook/close/logOut) с настраиваемой задержкой, ошибками и ответами 429.
+
+Запуск отдельно:
+    python fake_bot_api.py --port 8081 --latency 0.05 --flood-rate 0.01
+
+Подключение бота: build_application(token, base_url=server.base_url)
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Методы, для которых имитируются задержка, ошибки и флуд-контроль
+SEND_METHODS = ("sendMessage", "sendPhoto")
+
+FAKE_BOT_USER = {
+    "id": 100000001,
+    "is_bot": True,
+    "first_name": "Fake Kalendar Bot",
+    "username": "fake_kalendar_bot",
+}
+
+# ==================== РАЗБОР ЗАПРОСОВ ====================
+def parse_request_body(content_type: str, body: bytes) -> dict:
+    """
+    Разбирает тело запроса Bot API в словарь параметров.
+
+    Args:
+        content_type: Заголовок Content-Type запроса
+        body: Сырое тело запроса
+
+    Returns:
+        Словарь параметров; файлы заменяются их размером в байтах
+    """
+    if not body:
+        return {}
+
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename():
+                params[name] = len(payload)
+            else:
+                params[name] = payload.decode("utf-8")
+        return params
+
+    if content_type.startswith("application/json"):
+        return json.loads(body.decode("utf-8"))
+
+    return dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
+def chat_id_to_int(chat_id) -> int:
+    """
+    Превращает chat_id (число или @username) в стабильный числовой id.
+    """
+    try:
+        return int(chat_id)
+    except (TypeError, ValueError):
+        return -1000000000000 - (sum(map(ord, str(chat_id))) % 1000000)
+
+# ==================== СЕРВЕР ====================
+class FakeBotAPI:
+    """
+    Фейковый Bot API, работающий в отдельном потоке.
+
+    Все обращения записываются в self.calls (метод, параметры, время
+    получения и ответа, HTTP-статус), поэтому тесты и нагрузочный стенд
+    могут считать задержки и пропуски по данным самого «Telegram».
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, flood_rate: float = 0.0,
+                 retry_after: int = 1, seed: int = None):
+        """
+        Args:
+            host, port: Адрес для прослушивания (port=0 - любой свободный)
+            latency: Базовая задержка ответа на отправку, секунды
+            jitter: Случайная добавка к задержке (0..jitter), секунды
+            error_rate: Доля отправок, завершающихся ошибкой 400
+            flood_rate: Доля отправок, получающих 429 Too Many Requests
+            retry_after: Значение retry_after в ответах 429
+            seed: Зерно генератора случайных чисел для воспроизводимости
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.calls = []
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._new_updates = threading.Condition(self._lock)
+
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Адрес для Application.builder().base_url(...)"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        """Запускает сервер в фоновом потоке."""
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-bot-api", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"✅ Фейковый Bot API запущен: {self.base_url}")
+        return self
+
+    def stop(self):
+        """Останавливает сервер и будит ожидающие getUpdates."""
+        with self._new_updates:
+            self._new_updates.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ---------- Входящие обновления ----------
+    def push_command(self, text: str, user_id: int = 1, chat_id: int = None) -> int:
+        """
+        Ставит в очередь getUpdates сообщение с командой от пользователя.
+
+        Returns:
+            update_id созданного обновления
+        """
+        chat_id = chat_id if chat_id is not None else user_id
+        command = text.split()[0]
+        with self._new_updates:
+            update_id = next(self._update_ids)
+            self._updates.append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                    "text": text,
+                    "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+                },
+            })
+            self._new_updates.notify_all()
+        return update_id
+
+    def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+
+        with self._new_updates:
+            # Подтвержденные обновления удаляются, как в настоящем API
+            if offset:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._new_updates.wait(remaining)
+            limit = int(params.get("limit") or 100)
+            return list(self._updates[:limit])
+
+    # ---------- Исходящие сообщения ----------
+    def _make_message(self, params: dict, **extra) -> dict:
+        chat_id = params.get("chat_id")
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id_to_int(chat_id), "type": "channel"},
+        }
+        message.update(extra)
+        return message
+
+    def _dispatch(self, method: str, params: dict):
+        """
+        Выполняет метод API.
+
+        Returns:
+            Кортеж (HTTP-статус, тело ответа)
+        """
+        if method in SEND_METHODS:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            if delay:
+                time.sleep(delay)
+            roll = self.random.random()
+            if roll < self.flood_rate:
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            if roll < self.flood_rate + self.error_rate:
+                return 400, {
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: fake error",
+                }
+
+        if method == "getMe":
+            return 200, {"ok": True, "result": FAKE_BOT_USER}
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(params)}
+        if method in ("deleteWebhook", "close", "logOut"):
+            return 200, {"ok": True, "result": True}
+        if method == "sendMessage":
+            return 200, {"ok": True, "result": self._make_message(params, text=params.get("text", ""))}
+        if method == "sendPhoto":
+            photo = [{
+                "file_id": f"fake-photo-{time.monotonic_ns()}",
+                "file_unique_id": f"fake-{time.monotonic_ns()}",
+                "width": 1600,
+                "height": 1124,
+                "file_size": params.get("photo") if isinstance(params.get("photo"), int) else 0,
+            }]
+            return 200, {
+                "ok": True,
+                "result": self._make_message(params, photo=photo, caption=params.get("caption", "")),
+            }
+
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received = time.monotonic()
+                # Путь вида /bot<token>/<method>
+                method = urlparse(self.path).path.rstrip("/").rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                params = parse_request_body(self.headers.get("Content-Type", ""), body)
+
+                status, payload = server._dispatch(method, params)
+
+                data = json.dumps(payload).encode("utf-8")
+
+                # Записываем до ответа: клиент не должен увидеть ответ раньше журнала
+                if method != "getUpdates":
+                    with server._lock:
+                        server.calls.append({
+                            "method": method,
+                            "params": params,
+                            "status": status,
+                            "received": received,
+                            "responded": time.monotonic(),
+                        })
+
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент закрыл long polling при остановке
+                    pass
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def sent(self, method: str = None, chat_id=None, ok_only: bool = True) -> list:
+        """
+        Возвращает записанные отправки с фильтрами по методу, чату и статусу.
+        """
+        with self._lock:
+            calls = list(self.calls)
+        return [
+            c for c in calls
+            if (method is None or c["method"] == method)
+            and (chat_id is None or str(c["params"].get("chat_id")) == str(chat_id))
+            and (not ok_only or c["status"] == 200)
+        ]
+
+# ==================== ЗАПУСК ====================
+def main():
+    parser = argparse.ArgumentParser(description="Фейковый Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка отправки, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Разброс задержки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ошибок 400")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    server = FakeBotAPI(
+        host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, flood_rate=args.flood_rate, retry_after=args.retry_after,
+    )
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logger.info("⏹️ Фейковый Bot API остановлен")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
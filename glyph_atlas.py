@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Атлас глифов для быстрой отрисовки текста на карточках.
+
+Карточки используют небольшой набор символов (заглавная кириллица, цифры,
+знаки препинания) в GOST_A.TTF несколькими фиксированными размерами. Вместо
+растеризации через FreeType на каждый вызов ImageDraw.text атлас один раз
+на пару (шрифт, размер) рендерит альфа-маски глифов и запоминает их
+advance и кернинг. Строка собирается из масок, а на фон накладывается
+векторизованным альфа-смешиванием в NumPy.
+
+Результат совпадает с ImageDraw.text попиксельно (проверка: bench_render.py).
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from PIL import ImageColor, ImageFont
+
+# Базовый алфавит карточек; прочие символы добавляются в атлас при первой встрече
+BASE_ALPHABET = (
+    "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
+    "0123456789"
+    " .,:;!?-–—()«»\"'"
+)
+
+class GlyphAtlas:
+    """
+    Маски и метрики глифов одного шрифта одного размера.
+    """
+
+    def __init__(self, font_path: str, size: int, alphabet: str = BASE_ALPHABET):
+        """
+        Args:
+            font_path: Путь к TTF-шрифту
+            size: Размер шрифта
+            alphabet: Символы, которые растеризуются сразу
+        """
+        self.font = ImageFont.truetype(font_path, size)
+        self.size = size
+        self._glyphs = {}   # символ -> (маска, смещение x, смещение y, advance)
+        self._kerning = {}  # (символ, символ) -> поправка к advance
+        for char in alphabet:
+            self._glyph(char)
+        self.line_mask = lru_cache(maxsize=256)(self._line_mask)
+        # Слои занимают ~8 байт на пиксель строки, поэтому их кэш меньше
+        self.line_layer = lru_cache(maxsize=64)(self._line_layer)
+
+    def _glyph(self, char: str):
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            mask, (dx, dy) = self.font.getmask2(char, "L")
+            width, height = mask.size
+            alpha = np.asarray(mask, dtype=np.uint8).reshape(height, width)
+            glyph = (alpha, dx, dy, self.font.getlength(char))
+            self._glyphs[char] = glyph
+        return glyph
+
+    def _kern(self, left: str, right: str) -> float:
+        pair = (left, right)
+        kerning = self._kerning.get(pair)
+        if kerning is None:
+            kerning = (
+                self.font.getlength(left + right)
+                - self._glyph(left)[3]
+                - self._glyph(right)[3]
+            )
+            self._kerning[pair] = kerning
+        return kerning
+
+    def _pen_positions(self, text: str):
+        """Позиции пера для каждого символа и итоговая ширина строки."""
+        positions = []
+        pen = 0.0
+        previous = None
+        for char in text:
+            if previous is not None:
+                pen += self._kern(previous, char)
+            positions.append(pen)
+            pen += self._glyph(char)[3]
+            previous = char
+        return positions, pen
+
+    def textlength(self, text: str) -> float:
+        """Ширина строки - то же значение, что ImageDraw.textlength."""
+        return self._pen_positions(text)[1]
+
+    def _line_mask(self, text: str):
+        """
+        Собирает альфа-маску всей строки.
+
+        Returns:
+            Кортеж (маска, смещение x, смещение y) относительно точки вывода
+        """
+        positions, _ = self._pen_positions(text)
+        placed = []
+        for char, pen in zip(text, positions):
+            alpha, dx, dy, _ = self._glyph(char)
+            if alpha.size:
+                # FreeType ставит глиф в ближайший целый пиксель пера
+                placed.append((alpha, int(pen + 0.5) + dx, dy))
+
+        if not placed:
+            return np.zeros((0, 0), dtype=np.uint8), 0, 0
+
+        left = min(x for _, x, _ in placed)
+        top = min(y for _, _, y in placed)
+        right = max(x + a.shape[1] for a, x, _ in placed)
+        bottom = max(y + a.shape[0] for a, _, y in placed)
+
+        mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for alpha, x, y in placed:
+            region = mask[y - top:y - top + alpha.shape[0], x - left:x - left + alpha.shape[1]]
+            np.maximum(region, alpha, out=region)
+        mask.setflags(write=False)
+        return mask, left, top
+
+    def _line_layer(self, text: str, fill):
+        """
+        Готовит строку к смешиванию: инвертированная альфа и вклад цвета
+        (color * alpha + 128) в uint16 - хватает, т.к. 255 * 255 + 128 + 254 < 65536.
+        """
+        mask, dx, dy = self.line_mask(text)
+        rgb = ImageColor.getrgb(fill) if isinstance(fill, str) else fill
+        alpha = mask.astype(np.uint16)[:, :, None]
+        inverse = 255 - alpha
+        color_term = np.array(rgb[:3], dtype=np.uint16) * alpha + 128
+        inverse.setflags(write=False)
+        color_term.setflags(write=False)
+        return inverse, color_term, dx, dy
+
+    def draw(self, canvas: np.ndarray, xy, text: str, fill) -> None:
+        """
+        Выводит строку на RGB-массив (H, W, 3) uint8 на месте.
+
+        Args:
+            canvas: Массив изображения
+            xy: Точка вывода, как в ImageDraw.text (целые координаты)
+            text: Строка
+            fill: Цвет (имя или кортеж RGB)
+        """
+        inverse, color_term, dx, dy = self.line_layer(text, fill)
+        blend_layer(canvas, inverse, color_term, int(xy[0]) + dx, int(xy[1]) + dy)
+
+@lru_cache(maxsize=None)
+def get_atlas(font_path: str, size: int) -> GlyphAtlas:
+    """Атлас для пары (шрифт, размер), создается один раз на процесс."""
+    return GlyphAtlas(font_path, size)
+
+def blend_layer(canvas: np.ndarray, inverse: np.ndarray, color_term: np.ndarray, x: int, y: int) -> None:
+    """
+    Смешивает подготовленную строку с изображением, обрезая по краям холста.
+
+    Арифметика повторяет BLEND/DIV255 из Pillow, поэтому результат
+    совпадает с ImageDraw.text до пикселя:
+        out = DIV255(bg * (255 - a) + color * a)
+    """
+    height, width = canvas.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + inverse.shape[1], width), min(y + inverse.shape[0], height)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    region = canvas[y0:y1, x0:x1]
+    pixels = region.astype(np.uint16)
+    pixels *= inverse[y0 - y:y1 - y, x0 - x:x1 - x]
+    pixels += color_term[y0 - y:y1 - y, x0 - x:x1 - x]
+    pixels += pixels >> 8
+    pixels >>= 8
+    region[...] = pixels
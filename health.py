@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Время запуска по фазам и локальный HTTP-эндпоинт живости/готовности.
+
+    GET /live    200, пока процесс отвечает
+    GET /ready   200, когда прогреты все компоненты, иначе 503
+    GET /health  JSON: компоненты, время фаз запуска
+
+Бот готов, когда прогреты индекс постов, ассеты рендеринга и соединение
+с Bot API (см. bot.main). Оркестратору достаточно ждать /ready.
+"""
+
+import contextlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+class StartupTimer:
+    """
+    Длительность фаз запуска (фазы могут идти параллельно в разных потоках).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # фаза -> длительность, с
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, duration: float):
+        with self._lock:
+            self.phases[name] = duration
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self) -> str:
+        """Строка для лога: "конфигурация 3 мс, ..., всего 612 мс"."""
+        with self._lock:
+            parts = [f"{name} {duration * 1000:.0f} мс" for name, duration in self.phases.items()]
+        parts.append(f"всего {self.elapsed() * 1000:.0f} мс")
+        return ", ".join(parts)
+
+class HealthServer:
+    """
+    HTTP-эндпоинт живости и готовности, работающий в отдельном потоке.
+    """
+
+    def __init__(self, components, timer: StartupTimer = None,
+                 host: str = "127.0.0.1", port: int = 8088):
+        """
+        Args:
+            components: Имена компонентов, которые должны быть готовы
+            timer: Время фаз запуска для /health
+            host, port: Адрес для прослушивания (port=0 - любой свободный)
+        """
+        self.components = {name: False for name in components}
+        self.timer = timer
+        self.ready_since = None
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="health", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Эндпоинт готовности запущен: {self.url}/ready")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def mark(self, component: str, ready: bool = True):
+        """Отмечает компонент готовым (или снова неготовым)."""
+        with self._lock:
+            self.components[component] = ready
+            if self.is_ready():
+                self.ready_since = self.ready_since or time.time()
+            else:
+                self.ready_since = None
+
+    def is_ready(self) -> bool:
+        return all(self.components.values())
+
+    def status(self) -> dict:
+        with self._lock:
+            status = {
+                "live": True,
+                "ready": self.is_ready(),
+                "ready_since": self.ready_since,
+                "components": dict(self.components),
+            }
+        if self.timer:
+            status["startup_ms"] = {
+                name: round(duration * 1000) for name, duration in dict(self.timer.phases).items()
+            }
+        return status
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                status = server.status()
+                if path == "/live":
+                    code = 200
+                elif path == "/ready":
+                    code = 200 if status["ready"] else 503
+                elif path == "/health":
+                    code = 200
+                else:
+                    code, status = 404, {"error": "not found"}
+                data = json.dumps(status, ensure_ascii=False).encode("utf-8")
+                try:
+                    self.send_response(code)
+                    self.send_header("Content-Type", "application/json; charset=utf-8")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
@@ -1,170 +1,776 @@
-# image_generator.py
-from PIL import Image, ImageDraw, ImageFont
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Генерация карточек постов: единственная реализация рендеринга и сервис
+рендеринга на локальном HTTP.
+
+Карточка: фон + месяц (черный), черта, дата (красный, крупно), черта,
+тема поста (черный). Размеры шрифтов и отступы задаются шаблоном
+(TEMPLATES): "bot" - карточки канала, "classic" - прежняя раскладка этого
+модуля (шрифты 68/150/70, текст ниже и шире).
+
+Сервис держит прогретыми декодированные фоны и атласы глифов и принимает
+пачки запросов:
+    python image_generator.py --port 8765 --workers 2
+
+    POST /render  {"template": "bot", "requests": [
+                      {"theme": "...", "month": "ЯНВАРЬ", "day": "07",
+                       "output_path": "generated_images/post_07_01_14.jpg"}]}
+    ->            {"results": [{"output_path": "...", "error": null}]}
+    GET /health   -> {"status": "ok", "templates": [...], "rendered": N}
+
+С --processes карточки рисуют процессы, а фон с месяцем и датой дня
+(базовый слой) лежит в разделяемой памяти, одной копией на все процессы;
+/health показывает сегменты и память (RSS) каждого процесса:
+    python image_generator.py --workers 4 --processes
+
+Карточки пишутся в файловую систему сервиса; бот (RENDER_SERVICE_URL)
+получает в ответ пути. Без сервиса бот рисует той же функцией в процессе.
+Сервис пишет карточки только внутри разрешенных папок (--output-root,
+по умолчанию RENDER_OUTPUT_DIR); пачка с output_path вне них получает 400:
+    python image_generator.py --output-root /srv/bot/generated_images
+"""
+
+import argparse
+import json
+import logging
 import os
 import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING
 
-def create_post_image(theme, month, day, output_path="output/post_image.jpg"):
-    def remove_emoji_and_special(text):
-        """
-        Удаляет эмодзи и специальные символы, оставляя только кириллицу, латиницу, цифры и основные знаки препинания.
-        """
-        if not text:
-            return ""
-        
-        # Расширенный шаблон для эмодзи и специальных символов
-        emoji_pattern = re.compile(
-            "["
-            u"\U0001F600-\U0001F64F"  # эмотиконы
-            u"\U0001F300-\U0001F5FF"  # символы и пиктограммы
-            u"\U0001F680-\U0001F6FF"  # транспорт и карта
-            u"\U0001F1E0-\U0001F1FF"  # флаги (iOS)
-            u"\U00002500-\U00002BEF"  # различные символы
-            u"\U00002702-\U000027B0"
-            u"\U000024C2-\U0001F251"
-            u"\U0001f926-\U0001f937"
-            u"\U00010000-\U0010ffff"
-            u"\u2640-\u2642"
-            u"\u2600-\u2B55"
-            u"\u200d"  # символ соединения (для составных эмодзи)
-            u"\u23cf"
-            u"\u23e9"
-            u"\u231a"
-            u"\ufe0f"  # вариационный селектор-16
-            u"\u3030"
-            u"\u00A9\u00AE\u2122"  # знаки авторского права, товарные знаки
-            "]+",
-            flags=re.UNICODE,
-        )
-        
-        # Удаляем эмодзи по шаблону
-        text = emoji_pattern.sub(r'', text)
-        
-        # Дополнительно: удаляем оставшиеся непечатные и специальные символы,
-        # оставляя только кириллицу, латиницу, цифры, пробелы и основные знаки препинания
-        # Этот шаг гарантированно убирает "квадратики"
-        allowed_chars_pattern = re.compile(
-            r'[^'
-            r'a-zA-Zа-яА-ЯёЁ'  # латиница и кириллица
-            r'0-9'             # цифры
-            r'\s'              # пробелы
-            r'.,:;!?\-–—()\[\]{}«»"\''
-            r']+'
-        )
-        text = allowed_chars_pattern.sub(r'', text)
-        
-        return text.strip()
+# NumPy, Pillow и glyph_atlas импортируются при первом рендеринге: бот с внешним
+# сервисом рендеринга, export.py и клиент сервиса их не загружают вовсе
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
 
-    try:
-        # 1. Открываем фон
-        background_path = "assets/fon.jpg"
-        if not os.path.exists(background_path):
-            raise FileNotFoundError(f"Фоновое изображение не найдено: {background_path}")
-        img = Image.open(background_path)
+logger = logging.getLogger(__name__)
+
+# ==================== КОНФИГУРАЦИЯ ====================
+BACKGROUND_FILE = os.path.join("assets", "fon.jpg")   # Фон 1600x1124
+FONT_FILE = os.path.join("fonts", "GOST_A.TTF")       # Основной шрифт
+
+# Способ отрисовки текста: "atlas" (атлас глифов + NumPy) или "pillow" (ImageDraw.text);
+# результат попиксельно одинаковый (проверка: bench_render.py)
+TEXT_RENDERER = os.getenv("TEXT_RENDERER", "atlas").strip()
+
+# Шаблоны карточек: размеры шрифтов, отступы и ширина переноса темы
+TEMPLATES = {
+    # Карточки канала (раскладка бота)
+    "bot": {
+        "font_month": 90,
+        "font_date": 150,
+        "font_theme": 90,
+        "start_y": 220,          # Начальная позиция по Y
+        "line_height": 20,       # Расстояние между элементами
+        "line_thickness": 3,     # Толщина черт
+        "theme_line_spacing": 8,
+        "wrap_width": 0.6,       # Ширина строки темы - доля ширины фона
+    },
+    # Прежняя раскладка image_generator.py
+    "classic": {
+        "font_month": 68,
+        "font_date": 150,
+        "font_theme": 70,
+        "start_y": 550,
+        "line_height": 10,
+        "line_thickness": 3,
+        "theme_line_spacing": 8,
+        "wrap_width": 0.8,
+    },
+}
+
+DEFAULT_TEMPLATE = "classic"
+
+# Сервис рендеринга
+RENDER_SERVICE_HOST = "127.0.0.1"
+RENDER_SERVICE_PORT = 8765
+# Папка, внутри которой сервис пишет карточки (можно задать несколько через --output-root)
+RENDER_OUTPUT_DIR = os.getenv("RENDER_OUTPUT_DIR", "generated_images").strip()
+
+# ==================== РЕНДЕРИНГ ====================
+EMOJI_PATTERN = re.compile(
+    "["
+    u"\U0001F600-\U0001F64F"  # эмотиконы
+    u"\U0001F300-\U0001F5FF"  # символы и пиктограммы
+    u"\U0001F680-\U0001F6FF"  # транспорт и карта
+    u"\U0001F1E0-\U0001F1FF"  # флаги (iOS)
+    u"\U00002500-\U00002BEF"  # различные символы
+    u"\U00002702-\U000027B0"
+    u"\U000024C2-\U0001F251"
+    u"\U0001f926-\U0001f937"
+    u"\U00010000-\U0010ffff"
+    u"\u2640-\u2642"
+    u"\u2600-\u2B55"
+    u"\u200d"  # символ соединения (для составных эмодзи)
+    u"\u23cf"
+    u"\u23e9"
+    u"\u231a"
+    u"\ufe0f"  # вариационный селектор-16
+    u"\u3030"
+    u"\u00A9\u00AE\u2122"  # знаки авторского права, товарные знаки
+    "]+",
+    flags=re.UNICODE,
+)
+
+# Все, кроме кириллицы, латиницы, цифр, пробелов и основных знаков препинания
+# (этот шаг гарантированно убирает "квадратики")
+DISALLOWED_CHARS_PATTERN = re.compile(
+    r'[^'
+    r'a-zA-Zа-яА-ЯёЁ'  # латиница и кириллица
+    r'0-9'             # цифры
+    r'\s'              # пробелы
+    r'.,:;!?\-–—()\[\]{}«»"\''
+    r']+'
+)
+
+def remove_emoji_and_special(text: str) -> str:
+    """
+    Удаляет эмодзи и специальные символы, оставляя только кириллицу, латиницу, цифры и основные знаки препинания.
+    """
+    if not text:
+        return ""
+    text = EMOJI_PATTERN.sub(r'', text)
+    text = DISALLOWED_CHARS_PATTERN.sub(r'', text)
+    return text.strip()
+
+def asset_path(path: str, default: str) -> str:
+    """
+    Канонический абсолютный путь к фону или шрифту: кэши фонов, атласов и
+    базовых слоев не должны зависеть от того, как путь записан
+    (assets/fon.jpg у сервиса и /srv/bot/assets/fon.jpg у бота).
+    """
+    return os.path.realpath(path or default)
+
+@lru_cache(maxsize=4)
+def load_background(path: str, mtime: float) -> "np.ndarray":
+    """
+    Декодирует фон один раз и держит его в памяти как RGB-массив (только чтение).
+    mtime входит в ключ кэша, чтобы замена файла подхватывалась без перезапуска.
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as img:
+        background = np.array(img.convert('RGB'))
+    background.setflags(write=False)
+    return background
+
+def wrap_theme(theme: str, font, max_line_width: float) -> list:
+    """
+    Переносит тему по словам так, чтобы строки укладывались в max_line_width.
+    """
+    theme_lines = []
+    current_line = ""
+    for word in theme.split():
+        test_line = f"{current_line} {word}".strip()
+        # Проверяем ширину строки с новым словом
+        if font.textlength(test_line) <= max_line_width:
+            current_line = test_line
+        else:
+            if current_line:  # Сохраняем текущую строку, если она не пустая
+                theme_lines.append(current_line)
+            current_line = word  # Начинаем новую строку с текущего слова
+    if current_line:  # Добавляем последнюю строку
+        theme_lines.append(current_line)
+    return theme_lines
+
+def layout_card(theme: str, month: str, day: str, template: str, font_file: str, img_width: int) -> dict:
+    """
+    Раскладка карточки по шаблону.
+
+    Returns:
+        {"head": [...], "theme": [...], "lines": [...]}: текст месяца и даты,
+        строки темы - элементы (xy, текст, атлас, цвет) - и черты (пары точек)
+    """
+    from glyph_atlas import get_atlas  # Атлас глифов для быстрой отрисовки текста
+
+    layout = TEMPLATES[template]
+
+    # Атласы глифов для размеров шаблона
+    font_month = get_atlas(font_file, layout["font_month"])  # Месяц
+    font_date = get_atlas(font_file, layout["font_date"])    # Дата (крупно)
+    font_theme = get_atlas(font_file, layout["font_theme"])  # Тема
+
+    # Текст и черты сначала раскладываются, а рисуются в конце:
+    # текст - выбранным способом, черты - поверх через ImageDraw
+    head_items = []
+    theme_items = []
+    line_items = []
+
+    # Координаты и параметры шаблона
+    start_y = layout["start_y"]
+    line_height = layout["line_height"]
+
+    # Функция для расчета центральной позиции по X
+    # (ширина из атласа совпадает с ImageDraw.textlength)
+    def get_center_x(text, font):
+        text_width = font.textlength(text)
+        return (img_width - text_width) // 2
+
+    # Очищаем тему от эмодзи и специальных символов
+    logger.debug(f"[ГЕНЕРАТОР] Тема ДО очистки: {repr(theme)}")
+    theme = remove_emoji_and_special(theme)
+    logger.debug(f"[ГЕНЕРАТОР] Тема ПОСЛЕ очистки: {repr(theme)}")
+
+    # Месяц (черный)
+    month_x = get_center_x(month, font_month)
+    month_y = start_y
+    head_items.append(((month_x, month_y), month, font_month, "black"))
+
+    # Черта под месяцем
+    month_width = font_month.textlength(month)
+    line1_y = month_y + font_month.size + line_height
+    line_items.append([(month_x, line1_y), (month_x + month_width, line1_y)])
 
-        if img.mode != "RGB":
-            img = img.convert("RGB")
+    # Дата (красная, крупно)
+    date_y = line1_y + line_height * 2
+    day_x = get_center_x(day, font_date)
+    head_items.append(((day_x, date_y), day, font_date, "red"))
 
+    # Черта под датой
+    date_width = font_date.textlength(day)
+    line2_y = date_y + font_date.size + line_height
+    line_items.append([(day_x, line2_y), (day_x + date_width, line2_y)])
+
+    # Тема поста (черный) с переносом по ширине изображения
+    theme_y = line2_y + line_height * 2
+    theme_lines = wrap_theme(theme, font_theme, img_width * layout["wrap_width"])
+
+    # Если после очистки тема стала пустой, используем заглушку
+    if not theme_lines or all(not line.strip() for line in theme_lines):
+        theme_lines = ["Народный календарь"]
+        logger.debug("[ГЕНЕРАТОР] Тема оказалась пустой после очистки, использована заглушка")
+
+    for i, line in enumerate(theme_lines):
+        theme_x = get_center_x(line, font_theme)
+        current_theme_y = theme_y + i * (font_theme.size + layout["theme_line_spacing"])
+        theme_items.append(((theme_x, current_theme_y), line, font_theme, "black"))
+
+    return {"head": head_items, "theme": theme_items, "lines": line_items}
+
+def draw_card(base: "np.ndarray", text_items: list, line_items: list, line_thickness: int,
+              text_renderer: str) -> "Image.Image":
+    """
+    Рисует текст и черты на копии base (base не меняется).
+    """
+    from PIL import Image, ImageDraw
+
+    # Отрисовка текста: атлас смешивает маски прямо в массиве фона
+    if text_renderer == "atlas":
+        canvas = base.copy()
+        for xy, text, atlas, fill in text_items:
+            atlas.draw(canvas, xy, text, fill)
+        img = Image.fromarray(canvas)
         draw = ImageDraw.Draw(img)
-        
-        # 2. Загружаем шрифты
-        font_path = "fonts/GOST_A.TTF"
-        if not os.path.exists(font_path):
-            raise FileNotFoundError(f"Шрифт не найден: {font_path}")
-
-        # Размеры шрифтов (уже оптимизированные для компактности)
-        font_month = ImageFont.truetype(font_path, 68)
-        font_date = ImageFont.truetype(font_path, 150)
-        font_theme = ImageFont.truetype(font_path, 70)
-        
-        img_width, img_height = img.size
-        line_height = 10
-        start_y = 550  # Стартовая позиция (уже сдвинута вниз)
-
-        def get_center_x(text, font):
-            text_width = draw.textlength(text, font=font)
-            return (img_width - text_width) // 2
-
-        # ========== ВАЖНО: ОЧИСТКА ТЕМЫ ПЕРЕД ИСПОЛЬЗОВАНИЕМ ==========
-        # Логируем исходную тему для отладки
-        print(f"[DEBUG] Тема ДО очистки: {repr(theme)}")
-        
-        # Очищаем тему от эмодзи и специальных символов
-        theme_cleaned = remove_emoji_and_special(theme)
-        
-        # Логируем результат очистки
-        print(f"[DEBUG] Тема ПОСЛЕ очистки: {repr(theme_cleaned)}")
-        
-        # Выводим коды Unicode каждого символа для точной диагностики
-        print("[DEBUG] Символы в очищенной теме:")
-        for i, char in enumerate(theme_cleaned):
-            print(f"  Символ {i}: U+{ord(char):04X} - {repr(char)}")
-        
-        # Используем очищенную тему для дальнейшей обработки
-        theme = theme_cleaned
-        # =============================================================
-
-        # 3. Рисуем месяц (черный)
-        month_x = get_center_x(month, font_month)
-        draw.text((month_x, start_y), month, font=font_month, fill="black")
-        current_y = start_y + font_month.size + line_height
-
-        # 4. Черта под месяцем
-        line_y = current_y
-        month_width = draw.textlength(month, font=font_month)
-        draw.line([(month_x, line_y), (month_x + month_width, line_y)], fill="black", width=3)
-        current_y = line_y + line_height * 2
-
-        # 5. Дата
-        day_x = get_center_x(day, font_date)
-        draw.text((day_x, current_y), day, font=font_date, fill="red")
-        current_y = current_y + font_date.size + line_height
-
-        # 6. Черта под датой
-        line_y = current_y
-        day_width = draw.textlength(day, font=font_date)
-        draw.line([(day_x, line_y), (day_x + day_width, line_y)], fill="black", width=3)
-        current_y = line_y + line_height * 2
-
-        # 7. Тема поста (теперь гарантированно без эмодзи)
-        # Улучшенный перенос строк с учетом ширины
-        theme_lines = []
-        max_line_width = img_width * 0.8
-        
-        words = theme.split()
-        current_line = ""
-        
-        for word in words:
-            test_line = f"{current_line} {word}".strip()
-            if draw.textlength(test_line, font=font_theme) <= max_line_width:
-                current_line = test_line
-            else:
-                if current_line:
-                    theme_lines.append(current_line)
-                current_line = word
-        
-        if current_line:
-            theme_lines.append(current_line)
-        
-        # Если после очистки тема стала пустой, используем заглушку
-        if not theme_lines or all(not line.strip() for line in theme_lines):
-            theme_lines = ["Народный календарь"]
-            print("[DEBUG] Тема оказалась пустой после очистки, использована заглушка")
-        
-        theme_line_spacing = 8
-        
-        for theme_line in theme_lines:
-            theme_x = get_center_x(theme_line, font_theme)
-            draw.text((theme_x, current_y), theme_line, font=font_theme, fill="black")
-            current_y += font_theme.size + theme_line_spacing
-
-        # 8. Сохраняем изображение
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        img.save(output_path, "JPEG", quality=95)
-        print(f"✅ Изображение создано: {output_path}")
+    else:
+        img = Image.fromarray(base)
+        draw = ImageDraw.Draw(img)
+        for xy, text, atlas, fill in text_items:
+            draw.text(xy, text, font=atlas.font, fill=fill)
+
+    for points in line_items:
+        draw.line(points, fill="black", width=line_thickness)
+    return img
+
+def save_card(img: "Image.Image", output_path: str):
+    """
+    Сохраняет карточку: пишет во временный файл и подменяет целиком,
+    чтобы публикация карточки из кэша не прочитала ее недописанной.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    temp_path = f"{output_path}.{threading.get_ident()}.tmp"
+    img.save(temp_path, "JPEG", quality=95)
+    os.replace(temp_path, output_path)
+    logger.info(f"✅ Изображение создано: {output_path}")
+
+def create_post_image(theme: str, month: str, day: str, output_path: str = "output/post_image.jpg", *,
+                      template: str = DEFAULT_TEMPLATE, text_renderer: str = None,
+                      background_file: str = None, font_file: str = None) -> str:
+    """
+    Создает изображение для поста по шаблону.
+
+    Args:
+        theme: Тема поста (например, "ДЕНЬ В ИСТОРИИ: Луи Дагер")
+        month: Название месяца (например, "ЯНВАРЬ")
+        day: Число дня (например, "07")
+        output_path: Путь для сохранения готового изображения
+        template: Имя шаблона из TEMPLATES
+        text_renderer: "atlas" или "pillow"; по умолчанию - TEXT_RENDERER
+        background_file: Фон (по умолчанию - BACKGROUND_FILE)
+        font_file: Шрифт (по умолчанию - FONT_FILE)
+
+    Returns:
+        Путь к созданному изображению или None в случае ошибки
+    """
+    background_file = asset_path(background_file, BACKGROUND_FILE)
+    font_file = asset_path(font_file, FONT_FILE)
+    text_renderer = text_renderer or TEXT_RENDERER
+
+    try:
+        # Проверяем наличие необходимых файлов
+        if not os.path.exists(background_file):
+            logger.error(f"Фоновое изображение не найдено: {background_file}")
+            return None
+
+        if not os.path.exists(font_file):
+            logger.error(f"Шрифт не найден: {font_file}")
+            return None
+
+        # Декодированный фон из кэша, раскладка и отрисовка
+        background = load_background(background_file, os.path.getmtime(background_file))
+        card = layout_card(theme, month, day, template, font_file, background.shape[1])
+        img = draw_card(background, card["head"] + card["theme"], card["lines"],
+                        TEMPLATES[template]["line_thickness"], text_renderer)
+        save_card(img, output_path)
         return output_path
-        
+
     except Exception as e:
-        print(f"❌ Ошибка при создании изображения: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ Ошибка при создании изображения: {e}", exc_info=True)
         return None
+
+# ==================== РЕНДЕРИНГ В ПРОЦЕССАХ ====================
+# Постоянная часть карточки дня (фон, месяц, дата) рисуется один раз в процессе
+# сервиса и публикуется в разделяемой памяти (shared_rasters.py); процессы
+# рендеринга дорисовывают на ее копии тему и черты. Результат попиксельно
+# совпадает с create_post_image: текст и черты рисуются в том же порядке.
+
+def draw_base_layer(month: str, day: str, template: str, text_renderer: str,
+                    background_file: str, font_file: str) -> "np.ndarray":
+    """
+    Базовый слой дня: фон с месяцем и датой (без черт).
+
+    Raises:
+        FileNotFoundError: нет файла фона или шрифта
+    """
+    import numpy as np
+
+    for path in (background_file, font_file):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"файл не найден: {path}")
+    background = load_background(background_file, os.path.getmtime(background_file))
+    card = layout_card("", month, day, template, font_file, background.shape[1])
+    img = draw_card(background, card["head"], [], 0, text_renderer)
+    return np.asarray(img)
+
+def init_render_worker(font_file: str = None, templates=None):
+    """
+    Инициализация процесса рендеринга: лог и атласы глифов заранее
+    (фон процессу не нужен - он приходит в базовом слое).
+    """
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    warm_atlases(asset_path(font_file, FONT_FILE), templates)
+
+def render_on_base_layer(segment: dict, live_segments: list, theme: str, month: str, day: str,
+                         output_path: str, template: str, text_renderer: str, font_file: str) -> tuple:
+    """
+    Рисует карточку в процессе рендеринга поверх базового слоя из разделяемой памяти.
+
+    Returns:
+        (путь к карточке или None, память процесса - shared_rasters.process_memory())
+    """
+    import shared_rasters
+
+    try:
+        base = shared_rasters.attach(segment, live_segments)
+        card = layout_card(theme, month, day, template, font_file, base.shape[1])
+        img = draw_card(base, card["theme"], card["lines"],
+                        TEMPLATES[template]["line_thickness"], text_renderer)
+        del base
+        save_card(img, output_path)
+        result = output_path
+    except Exception as e:
+        logger.error(f"❌ Ошибка при создании изображения: {e}", exc_info=True)
+        result = None
+    return result, shared_rasters.process_memory()
+
+def warm_atlases(font_file: str, templates=None):
+    """Строит атласы глифов всех размеров шрифта из шаблонов (нет файла - ничего)."""
+    from glyph_atlas import get_atlas
+
+    if os.path.exists(font_file):
+        for name in templates or TEMPLATES:
+            layout = TEMPLATES[name]
+            for size_key in ("font_month", "font_date", "font_theme"):
+                get_atlas(font_file, layout[size_key])
+
+def warm_up(background_file: str = None, font_file: str = None, templates=None):
+    """
+    Декодирует фон и строит атласы глифов заранее, чтобы первая карточка
+    не платила за холодный старт.
+    """
+    background_file = asset_path(background_file, BACKGROUND_FILE)
+    if os.path.exists(background_file):
+        load_background(background_file, os.path.getmtime(background_file))
+    warm_atlases(asset_path(font_file, FONT_FILE), templates)
+
+# ==================== СЕРВИС РЕНДЕРИНГА ====================
+class RenderService:
+    """
+    HTTP-сервис рендеринга, работающий в отдельном потоке.
+
+    Каждый запрос - пачка карточек, которая рисуется пулом потоков сервиса;
+    фоны и атласы общие для всех запросов и остаются прогретыми.
+
+    С processes=True карточки рисуют отдельные процессы: базовые слои дней
+    публикуются в разделяемой памяти (shared_rasters.py), и процессы не
+    декодируют фон каждый сам. Если процесс рендеринга падает, пачка
+    получает 503, пул пересоздается, а /health показывает сбой, пока
+    следующая пачка не нарисуется в новом пуле.
+    """
+
+    def __init__(self, host: str = RENDER_SERVICE_HOST, port: int = RENDER_SERVICE_PORT,
+                 workers: int = 2, processes: bool = False, shared_segments: int = 4,
+                 font_file: str = None, output_roots=None):
+        """
+        Args:
+            host, port: Адрес для прослушивания (port=0 - любой свободный)
+            workers: Сколько карточек рисуется одновременно
+            processes: Рисовать в процессах, а не в потоках
+            shared_segments: Сколько базовых слоев держать в разделяемой памяти
+            font_file: Шрифт, атласы которого процессы рендеринга строят при старте
+            output_roots: Папки, внутри которых можно писать карточки
+                (по умолчанию RENDER_OUTPUT_DIR)
+        """
+        self.workers = workers
+        self.output_roots = [os.path.realpath(root) for root in output_roots or [RENDER_OUTPUT_DIR]]
+        self.font_file = font_file
+        if processes:
+            from shared_rasters import SharedRasters
+
+            self.executor = self._process_pool()
+            self.rasters = SharedRasters(shared_segments)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-service")
+            self.rasters = None
+        self.worker_memory = {}  # pid процесса рендеринга -> память (МБ) после последней карточки
+        self.rendered = 0
+        self.failed = 0
+        self.pool_failures = 0   # сколько раз пул процессов ломался и пересоздавался
+        self.pool_error = None   # последний сбой пула, пока новый пул не нарисовал пачку
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Запускает сервер в фоновом потоке."""
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="render-service", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"✅ Сервис рендеринга запущен: {self.url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+        self.executor.shutdown(wait=True)
+        if self.rasters is not None:
+            for memory in self.worker_memory.values():
+                logger.info(f"📊 Процесс рендеринга {memory['pid']}: RSS {memory.get('rss')} МБ "
+                            f"(свой {memory.get('private')}, разделяемый {memory.get('shared')})")
+            self.rasters.close()
+
+    def _process_pool(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn: процесс сервиса многопоточный, fork из него небезопасен
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_render_worker, initargs=(self.font_file,),
+        )
+
+    def _replace_broken_pool(self, executor, error: BrokenExecutor):
+        """
+        Пересоздает сломанный пул (процесс рендеринга упал или был убит).
+        Пачки, одновременно заставшие сбой, пересоздают пул один раз.
+        """
+        with self._lock:
+            if self.executor is not executor:
+                return
+            self.pool_failures += 1
+            self.pool_error = str(error) or type(error).__name__
+            self.executor = self._process_pool()
+            self.worker_memory.clear()
+        executor.shutdown(wait=False)
+        logger.error(f"❌ Пул процессов рендеринга сломан ({self.pool_error}), пул пересоздан")
+
+    def _output_path(self, output_path: str) -> str:
+        """
+        Путь к карточке внутри разрешенных папок (ссылки раскрываются).
+
+        Raises:
+            ValueError: путь вне output_roots
+        """
+        path = os.path.realpath(output_path)
+        if not any(os.path.commonpath([root, path]) == root and path != root for root in self.output_roots):
+            raise ValueError(f"output_path вне разрешенных папок: {output_path!r}")
+        return path
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def render_batch(self, payload: dict) -> list:
+        """
+        Рисует пачку карточек.
+
+        Args:
+            payload: {"template": ..., "requests": [{theme, month, day, output_path,
+                template?, text_renderer?, background_file?, font_file?}, ...]}
+
+        Returns:
+            Список {"output_path": путь или None, "error": текст или None} в порядке запросов
+
+        Raises:
+            ValueError: output_path вне разрешенных папок (пачка не рисуется)
+            BrokenExecutor: процесс рендеринга упал (пул уже пересоздан)
+        """
+        default_template = payload.get("template", DEFAULT_TEMPLATE)
+        requests = payload.get("requests", [])
+        output_paths = [self._output_path(request["output_path"]) for request in requests]
+        executor = self.executor
+        futures = []
+        segments = []  # закрепленные базовые слои пачки
+        try:
+            for request, output_path in zip(requests, output_paths):
+                template = request.get("template", default_template)
+                if template not in TEMPLATES:
+                    futures.append(f"неизвестный шаблон {template!r}")
+                    continue
+                if self.rasters is None:
+                    futures.append(executor.submit(
+                        create_post_image,
+                        request["theme"], request["month"], request["day"], output_path,
+                        template=template, text_renderer=request.get("text_renderer"),
+                        background_file=request.get("background_file"), font_file=request.get("font_file"),
+                    ))
+                    continue
+                text_renderer = request.get("text_renderer") or TEXT_RENDERER
+                font_file = asset_path(request.get("font_file"), FONT_FILE)
+                try:
+                    segment = self._base_layer(
+                        request["month"], request["day"], template, text_renderer,
+                        asset_path(request.get("background_file"), BACKGROUND_FILE), font_file,
+                    )
+                except OSError as e:
+                    logger.error(f"❌ Базовый слой для {request['output_path']}: {e}")
+                    futures.append(f"базовый слой: {e}")
+                    continue
+                segments.append(segment)
+                futures.append(executor.submit(
+                    render_on_base_layer, segment, self.rasters.names(),
+                    request["theme"], request["month"], request["day"], output_path,
+                    template, text_renderer, font_file,
+                ))
+
+            results = []
+            for future in futures:
+                if isinstance(future, str):
+                    results.append({"output_path": None, "error": future})
+                    continue
+                output_path = future.result()
+                if self.rasters is not None:
+                    output_path, memory = output_path
+                    self.worker_memory[memory["pid"]] = memory
+                results.append({
+                    "output_path": output_path,
+                    "error": None if output_path else "ошибка рендеринга (см. лог сервиса)",
+                })
+        except BrokenExecutor as e:
+            if self.rasters is not None:
+                self._replace_broken_pool(executor, e)
+            raise
+        finally:
+            for segment in segments:
+                self.rasters.release(segment)
+
+        with self._lock:
+            self.rendered += sum(1 for result in results if result["output_path"])
+            self.failed += sum(1 for result in results if not result["output_path"])
+            if futures and self.executor is executor:
+                self.pool_error = None
+        return results
+
+    def _base_layer(self, month: str, day: str, template: str, text_renderer: str,
+                    background_file: str, font_file: str) -> dict:
+        """
+        Закрепленный сегмент с базовым слоем дня (см. render_batch).
+        Слои замененного файла фона или шрифта выводятся из оборота.
+
+        Raises:
+            OSError: нет файла фона или шрифта
+        """
+        background_mtime = os.path.getmtime(background_file)
+        font_mtime = os.path.getmtime(font_file)
+        self.rasters.retire(lambda key: key[:2] == (background_file, font_file)
+                            and key[2:4] != (background_mtime, font_mtime))
+        key = (background_file, font_file, background_mtime, font_mtime, template, text_renderer, month, day)
+        return self.rasters.acquire(key, lambda: draw_base_layer(
+            month, day, template, text_renderer, background_file, font_file
+        ))
+
+    def status(self) -> dict:
+        """Состояние для GET /health."""
+        status = {
+            "status": "ok" if self.pool_error is None else "degraded",
+            "templates": sorted(TEMPLATES),
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "mode": "processes" if self.rasters is not None else "threads",
+        }
+        if self.rasters is not None:
+            status["shared"] = self.rasters.status()
+            status["pool_failures"] = self.pool_failures
+            status["pool_error"] = self.pool_error
+            status["workers"] = sorted(self.worker_memory.values(), key=lambda memory: memory["pid"])
+        return status
+
+    def _make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, payload: dict):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/health":
+                    self._reply(404, {"error": "not found"})
+                    return
+                self._reply(200, service.status())
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/render":
+                    self._reply(404, {"error": "not found"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    payload = json.loads(self.rfile.read(length).decode("utf-8"))
+                    results = service.render_batch(payload)
+                except (ValueError, KeyError, TypeError) as e:
+                    self._reply(400, {"error": f"некорректный запрос: {e}"})
+                    return
+                except BrokenExecutor as e:
+                    self._reply(503, {"error": f"процесс рендеринга упал, пул пересоздан: {e}"})
+                    return
+                self._reply(200, {"results": results})
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+class RenderClient:
+    """
+    Клиент сервиса рендеринга (для бота и других инструментов).
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        """
+        Args:
+            url: Адрес сервиса, например http://127.0.0.1:8765
+            timeout: Ожидание ответа на пачку, секунды
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def render_batch(self, requests: list, template: str = DEFAULT_TEMPLATE) -> list:
+        """
+        Отправляет пачку запросов (словари как в RenderService.render_batch).
+
+        Returns:
+            Пути к карточкам (None для неудавшихся) в порядке запросов
+
+        Raises:
+            OSError: сервис недоступен или ответил ошибкой
+        """
+        body = json.dumps({"template": template, "requests": requests}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.url}/render", data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            results = json.loads(response.read().decode("utf-8"))["results"]
+        for item, result in zip(requests, results):
+            if result["error"]:
+                logger.error(f"❌ Сервис рендеринга: {item.get('output_path')}: {result['error']}")
+        return [result["output_path"] for result in results]
+
+    def create_post_image(self, theme: str, month: str, day: str, output_path: str, *,
+                          template: str = DEFAULT_TEMPLATE, text_renderer: str = None,
+                          background_file: str = None, font_file: str = None) -> str:
+        """Одна карточка; аргументы как у create_post_image."""
+        request = {"theme": theme, "month": month, "day": day, "output_path": output_path}
+        if text_renderer:
+            request["text_renderer"] = text_renderer
+        if background_file:
+            request["background_file"] = background_file
+        if font_file:
+            request["font_file"] = font_file
+        return self.render_batch([request], template)[0]
+
+    def health(self) -> dict:
+        """
+        Raises:
+            OSError: сервис недоступен
+        """
+        with urllib.request.urlopen(f"{self.url}/health", timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+# ==================== ЗАПУСК СЕРВИСА ====================
+def main():
+    parser = argparse.ArgumentParser(description="Сервис рендеринга карточек")
+    parser.add_argument("--host", default=RENDER_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=RENDER_SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=2, help="Карточек одновременно")
+    parser.add_argument("--background", default=BACKGROUND_FILE, help="Фон для прогрева")
+    parser.add_argument("--font", default=FONT_FILE, help="Шрифт для прогрева")
+    parser.add_argument("--processes", action="store_true",
+                        help="Рисовать в процессах (базовые слои в разделяемой памяти)")
+    parser.add_argument("--shared-segments", type=int, default=4,
+                        help="Сколько базовых слоев держать в разделяемой памяти")
+    parser.add_argument("--output-root", action="append", dest="output_roots",
+                        help=f"Папка, внутри которой можно писать карточки (можно несколько; "
+                             f"по умолчанию {RENDER_OUTPUT_DIR})")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    started = time.perf_counter()
+    warm_up(args.background, args.font)
+    logger.info(f"🔥 Фон и атласы глифов прогреты за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    service = RenderService(args.host, args.port, args.workers, args.processes, args.shared_segments,
+                            font_file=args.font, output_roots=args.output_roots)
+    service.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logger.info("⏹️ Сервис рендеринга остановлен")
+    finally:
+        service.stop()
+
+if __name__ == "__main__":
+    main()
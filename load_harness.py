@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный стенд с виртуальными часами.
+
+Поднимает фейковый Bot API (fake_bot_api.py), собирает настоящее приложение
+через bot.build_application() и «прокручивает» год публикаций: для каждого
+дня и каждого часа из POST_HOURS переводит часы бота на время слота и
+запускает задание post_HH. Параллельно в getUpdates подается пачка команд
+/test, /status и /start.
+
+Отчет: пропущенные слоты, p50/p99 задержки публикации и пропускная способность.
+
+Пример:
+    python load_harness.py --days 365 --commands 300 --latency 0.05 --flood-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import bot
+from fake_bot_api import FakeBotAPI
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ("/test", "/status", "/start")
+
+# ==================== ВИРТУАЛЬНЫЕ ЧАСЫ ====================
+class VirtualClock:
+    """
+    Виртуальное московское время для бота.
+
+    install() подменяет bot.datetime подклассом, у которого now() и utcnow()
+    возвращают виртуальное время; остальной код бота не меняется.
+    """
+
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def set(self, moment: datetime):
+        self.current = moment
+
+    def install(self):
+        clock = self
+
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.current
+
+            @classmethod
+            def utcnow(cls):
+                return clock.current - timedelta(hours=3)
+
+        self._original = bot.datetime
+        bot.datetime = VirtualDatetime
+
+    def uninstall(self):
+        bot.datetime = self._original
+
+# ==================== СТАТИСТИКА ====================
+def percentile(values: list, p: float) -> float:
+    """Перцентиль методом ближайшего ранга (0, если значений нет)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def find_publication(server: FakeBotAPI, channel: str, expected_prefix: str, since_index: int):
+    """
+    Ищет успешную отправку в канал, текст которой начинается с expected_prefix.
+    """
+    for call in server.sent(chat_id=channel)[since_index:]:
+        text = call["params"].get("caption") or call["params"].get("text") or ""
+        if text.startswith(expected_prefix):
+            return call
+    return None
+
+# ==================== ПРОГОН ====================
+async def push_command_burst(server: FakeBotAPI, count: int) -> dict:
+    """
+    Подает count команд от разных пользователей.
+
+    Returns:
+        Словарь user_id -> (команда, момент подачи)
+    """
+    pushed = {}
+    for i in range(count):
+        command = COMMANDS[i % len(COMMANDS)]
+        user_id = 10000 + i
+        server.push_command(command, user_id=user_id)
+        pushed[user_id] = (command, time.monotonic())
+    return pushed
+
+def collect_command_latencies(server: FakeBotAPI, pushed: dict, ok_only: bool = True) -> dict:
+    """
+    Сопоставляет поданные команды с ответами пользователям. Команда, которую
+    отклонил планировщик, тоже получает ответ (bot.REJECTED_MESSAGES) - такие
+    ответы считаются отдельно и в задержки выполненных команд не входят.
+
+    Args:
+        ok_only: Учитывать только успешные ответы (иначе - любые попытки)
+
+    Returns:
+        Словарь команда -> {"served": задержки ответа, с; "rejected": задержки отказа, с}
+    """
+    rejected_texts = set(bot.REJECTED_MESSAGES.values())
+    replies = {}
+    for call in server.sent(method="sendMessage", ok_only=ok_only):
+        chat_id = str(call["params"].get("chat_id"))
+        if chat_id.lstrip("-").isdigit() and int(chat_id) in pushed:
+            rejected = call["params"].get("text") in rejected_texts
+            replies.setdefault(int(chat_id), (call["responded"], rejected))
+
+    latencies = {command: {"served": [], "rejected": []} for command in COMMANDS}
+    for user_id, (command, pushed_at) in pushed.items():
+        if user_id in replies:
+            responded, rejected = replies[user_id]
+            latencies[command]["rejected" if rejected else "served"].append(responded - pushed_at)
+    return latencies
+
+async def run_harness(args) -> dict:
+    server = FakeBotAPI(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        flood_rate=args.flood_rate, retry_after=args.retry_after, seed=args.seed,
+    ).start()
+
+    start = datetime.strptime(args.start, "%Y-%m-%d")
+    clock = VirtualClock(start)
+    clock.install()
+
+    generated_dir = bot.GENERATED_DIR
+    bot.GENERATED_DIR = args.output_dir or tempfile.mkdtemp(prefix="harness_images_")
+
+    app = bot.build_application("123456:FAKE-TOKEN", base_url=server.base_url)
+    if args.profile:
+        # Профили первых публикаций - в bot.PROFILE_DIR, как в боевом режиме
+        bot.profiler.arm(args.profile, args.profile_mode, args.profile_memory)
+    calendars = app.bot_data["calendars"]
+    hours = sorted(set(hour for calendar in calendars for hour in calendar.post_hours))
+    await app.initialize()
+    await app.updater.start_polling(poll_interval=0.0, timeout=1)
+    await app.start()
+    # Реальный планировщик не нужен: слоты запускаются по виртуальным часам
+    app.job_queue.scheduler.pause()
+
+    slots = []
+    pushed = {}
+    burst_hour = args.burst_day * len(hours)
+    hours_done = 0
+    wall_start = time.monotonic()
+
+    try:
+        for day_offset in range(args.days):
+            day = start + timedelta(days=day_offset)
+            for hour in hours:
+                if hours_done == burst_hour and args.commands:
+                    pushed = await push_command_burst(server, args.commands)
+                hours_done += 1
+                clock.set(day.replace(hour=hour, minute=0, second=10))
+
+                # Календари с этим часом публикуются одновременно, как в JobQueue
+                runs = []
+                for calendar in calendars:
+                    if hour not in calendar.post_hours:
+                        continue
+                    post_text = bot.load_post(day.day, day.month, hour, calendar.posts_dir)
+                    slot = {
+                        "calendar": calendar.name,
+                        "date": day.strftime("%d-%m"),
+                        "hour": hour,
+                        "has_content": bool(post_text.strip()),
+                        "expected_prefix": bot.escape_markdown_v2(post_text)[:200],
+                        "since_index": len(server.sent(chat_id=calendar.channel)),
+                        "channel": calendar.channel,
+                    }
+                    job = app.job_queue.get_jobs_by_name(calendar.job_name(hour))[0]
+                    runs.append(job.run(app))
+                    slots.append(slot)
+
+                started = time.monotonic()
+                await asyncio.gather(*runs)
+                for slot in slots[len(slots) - len(runs):]:
+                    slot["duration"] = time.monotonic() - started
+                    if slot["has_content"]:
+                        call = find_publication(server, slot["channel"], slot["expected_prefix"], slot["since_index"])
+                        slot["published"] = call is not None
+                        if call:
+                            slot["latency"] = call["responded"] - started
+                            slot["with_image"] = call["method"] == "sendPhoto"
+
+        slots_wall = time.monotonic() - wall_start
+
+        # Ждем ответов на все команды
+        deadline = time.monotonic() + args.command_timeout
+        while pushed and time.monotonic() < deadline:
+            # Ответ с ошибкой от API тоже завершает обработку команды
+            attempts = collect_command_latencies(server, pushed, ok_only=False)
+            answered = sum(len(v["served"]) + len(v["rejected"]) for v in attempts.values())
+            if answered >= len(pushed):
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        await app.updater.stop()
+        await app.stop()
+        await app.shutdown()
+        server.stop()
+        clock.uninstall()
+        bot.GENERATED_DIR = generated_dir
+
+    with_content = [s for s in slots if s["has_content"]]
+    published = [s for s in with_content if s.get("published")]
+    latencies = [s["latency"] for s in published]
+    command_latencies = collect_command_latencies(server, pushed)
+
+    return {
+        "slots_total": len(slots),
+        "slots_with_content": len(with_content),
+        "slots_published": len(published),
+        "slots_with_image": sum(1 for s in published if s.get("with_image")),
+        "missed_slots": [
+            f"{s['calendar']} {s['date']} {s['hour']:02d}:00"
+            for s in with_content if not s.get("published")
+        ],
+        "calendars": {
+            calendar.name: dict(calendar.metrics) for calendar in calendars
+        },
+        "publish_latency_p50": percentile(latencies, 50),
+        "publish_latency_p99": percentile(latencies, 99),
+        "publish_latency_max": max(latencies, default=0.0),
+        "slots_wall_seconds": slots_wall,
+        "throughput_posts_per_second": len(published) / slots_wall if slots_wall else 0.0,
+        "commands_pushed": len(pushed),
+        "commands": {
+            command: {
+                "served": len(values["served"]),
+                "rejected": len(values["rejected"]),
+                "p50": percentile(values["served"], 50),
+                "p99": percentile(values["served"], 99),
+            }
+            for command, values in command_latencies.items()
+        },
+        "work_scheduler": bot.work_scheduler.stats(),
+        "api_calls": len(server.calls),
+        "api_errors": sum(1 for c in server.calls if c["status"] != 200),
+    }
+
+def print_report(report: dict):
+    print("=" * 50)
+    print(f"Слотов всего:            {report['slots_total']}")
+    print(f"Слотов с контентом:      {report['slots_with_content']}")
+    print(f"Опубликовано:            {report['slots_published']} "
+          f"(с изображением: {report['slots_with_image']})")
+    print(f"Пропущено:               {len(report['missed_slots'])}")
+    for slot in report["missed_slots"][:20]:
+        print(f"  - {slot}")
+    for name, metrics in report["calendars"].items():
+        print(f"  [{name}] с изображением: {metrics['published_photo']}, "
+              f"из кэша: {metrics['published_cached']}, текстом: {metrics['published_text']}, "
+              f"пропущено: {metrics['skipped_deadline']}, сверх бюджета: {metrics['over_budget']}, "
+              f"ошибок: {metrics['failed']}")
+    print(f"Задержка публикации p50: {report['publish_latency_p50'] * 1000:.1f} мс")
+    print(f"Задержка публикации p99: {report['publish_latency_p99'] * 1000:.1f} мс")
+    print(f"Задержка публикации max: {report['publish_latency_max'] * 1000:.1f} мс")
+    print(f"Пропускная способность:  {report['throughput_posts_per_second']:.2f} постов/с")
+    print(f"Команд подано:           {report['commands_pushed']}")
+    for command, stats in report["commands"].items():
+        print(f"  {command:<8} выполнено: {stats['served']:<5} отклонено: {stats['rejected']:<5} "
+              f"p50: {stats['p50'] * 1000:.1f} мс  p99: {stats['p99'] * 1000:.1f} мс")
+    work = report["work_scheduler"]
+    print(f"Команд принято: {work['interactive_admitted']}, отклонено: "
+          f"{work['rejected_queue_full']} (очередь) / {work['rejected_rate_limited']} (лимит), "
+          f"ожидание p50/p99: {work['wait_p50'] * 1000:.1f}/{work['wait_p99'] * 1000:.1f} мс")
+    print(f"Вызовов API: {report['api_calls']}, ошибок: {report['api_errors']}")
+    print("=" * 50)
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный стенд бота с виртуальными часами")
+    parser.add_argument("--start", default=f"{datetime.now().year}-01-01", help="Первый день (ГГГГ-ММ-ДД)")
+    parser.add_argument("--days", type=int, default=365, help="Сколько дней прокрутить")
+    parser.add_argument("--commands", type=int, default=300, help="Размер пачки команд")
+    parser.add_argument("--burst-day", type=int, default=0, help="В какой день подать пачку команд")
+    parser.add_argument("--command-timeout", type=float, default=120.0, help="Ожидание ответов на команды, с")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка фейкового API, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Разброс задержки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ошибок 400")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profile", type=int, default=0, help="Профилировать N первых публикаций/команд")
+    parser.add_argument("--profile-mode", default="sampling", choices=["sampling", "cprofile"])
+    parser.add_argument("--profile-memory", action="store_true", help="Снимки tracemalloc вокруг create_post_image")
+    parser.add_argument("--output-dir", default=None, help="Куда сохранять изображения (по умолчанию - временная папка)")
+    parser.add_argument("--json", default=None, help="Сохранить отчет в JSON-файл")
+    parser.add_argument("--verbose", action="store_true", help="Подробные логи бота")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    report = asyncio.run(run_harness(args))
+    print_report(report)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
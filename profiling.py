@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Профилирование по запросу для заданий по расписанию и команд.
+
+Профилировщик "взводится" на N следующих выполнений (командой /profile
+или переменными окружения PROFILE_*). Для каждого выполнения создается
+папка в PROFILE_DIR с результатами:
+- cprofile: profile.prof (для snakeviz/pstats) и profile.txt (топ функций);
+- sampling: stacks.collapsed - свернутые стеки всех потоков
+  (flamegraph.pl, speedscope, inferno);
+- memory: memory.txt - снимки tracemalloc до и после каждого
+  create_post_image и рост памяти по строкам кода.
+
+Профиль охватывает окно выполнения целиком: все, что процесс делает в это
+время, включая потоки рендеринга. Одновременно профилируется одно
+выполнение; остальные в это время идут как обычно и счетчик не тратят.
+
+Пока профилировщик не взведен, run() и traced() сводятся к проверке
+одного атрибута.
+"""
+
+import contextlib
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+# Собственные выделения профилировщиков не показываем в отчете о памяти
+_MEMORY_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+class StackSampler(threading.Thread):
+    """
+    Фоновый поток, который с заданным интервалом снимает стеки всех потоков
+    и считает одинаковые стеки (формат collapsed: "a;b;c количество").
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+class ProfileRun:
+    """
+    Одно профилируемое выполнение: сбор данных и запись результатов.
+    """
+
+    def __init__(self, label: str, mode: str, memory: bool, output_dir: str, sample_interval: float):
+        self.label = label
+        self.mode = mode
+        self.memory = memory
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        safe_label = re.sub(r"[^\w-]+", "_", label)
+        self.path = os.path.join(output_dir, f"{stamp}_{safe_label}")
+        self.sample_interval = sample_interval
+        self.thread_profiles = []  # cProfile из потоков рендеринга
+        self.memory_report = []
+        self._lock = threading.Lock()
+        self._profile = None
+        self._sampler = None
+        self._started = None
+        self._owner = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._owner = threading.get_ident()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(self.sample_interval)
+            self._sampler.start()
+
+    def stop(self) -> float:
+        """Останавливает сбор данных и возвращает длительность выполнения, с."""
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        return time.perf_counter() - self._started
+
+    @contextlib.contextmanager
+    def section(self, name: str):
+        """
+        Участок кода в любом потоке: отдельный cProfile для потоков рендеринга
+        (поток цикла событий уже профилируется) и снимки tracemalloc до/после.
+        """
+        profile = None
+        if self.mode == "cprofile" and threading.get_ident() != self._owner:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # В этом потоке уже работает другой профилировщик
+                profile = None
+        before = None
+        if self.memory and tracemalloc.is_tracing():
+            before = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            if before is not None and not tracemalloc.is_tracing():
+                before = None  # выполнение закончилось и отслеживание уже выключено
+            if before is not None:
+                after = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+                current, peak = tracemalloc.get_traced_memory()
+                lines = [f"{name} [{threading.current_thread().name}]: "
+                         f"отслеживается {current / 1024:.0f} КБ, пик {peak / 1024:.0f} КБ"]
+                lines += [f"    {stat}" for stat in after.compare_to(before, "lineno")[:10]]
+            with self._lock:
+                if profile is not None:
+                    self.thread_profiles.append(profile)
+                if before is not None:
+                    self.memory_report.append("\n".join(lines))
+
+    def write(self, duration: float):
+        """Записывает результаты в папку выполнения."""
+        os.makedirs(self.path, exist_ok=True)
+
+        if self._profile is not None:
+            stats = pstats.Stats(self._profile)
+            for profile in self.thread_profiles:
+                stats.add(profile)
+            stats.dump_stats(os.path.join(self.path, "profile.prof"))
+            with open(os.path.join(self.path, "profile.txt"), "w", encoding="utf-8") as f:
+                f.write(f"{self.label}: {duration * 1000:.1f} мс\n\n")
+                stats.stream = f
+                stats.sort_stats("cumulative").print_stats(40)
+
+        if self._sampler is not None:
+            with open(os.path.join(self.path, "stacks.collapsed"), "w", encoding="utf-8") as f:
+                for stack, count in self._sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        if self.memory:
+            with open(os.path.join(self.path, "memory.txt"), "w", encoding="utf-8") as f:
+                f.write(f"{self.label}: {duration * 1000:.1f} мс\n\n")
+                f.write("\n\n".join(self.memory_report) or "create_post_image не вызывался")
+                f.write("\n")
+
+class Profiler:
+    """
+    Профилирование следующих N выполнений.
+    """
+
+    def __init__(self, output_dir: str, sample_interval: float = 0.005):
+        """
+        Args:
+            output_dir: Папка для результатов
+            sample_interval: Интервал снятия стеков в режиме sampling, секунды
+        """
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.mode = "sampling"
+        self.memory = False
+        self.completed = deque(maxlen=20)  # папки последних выполнений
+        self._remaining = 0
+        self._active = None
+        self._started_tracemalloc = False
+
+    def arm(self, runs: int, mode: str = "sampling", memory: bool = False):
+        """
+        Взводит профилировщик на следующие runs выполнений.
+
+        Raises:
+            ValueError: неизвестный режим или отрицательное число выполнений
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Неизвестный режим профилирования: {mode}")
+        if runs < 0:
+            raise ValueError(f"Число выполнений не может быть отрицательным: {runs}")
+        self.mode = mode
+        self.memory = memory
+        self._remaining = runs
+        if runs and memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        logger.info(f"🔬 Профилирование взведено: {runs} выполн., режим {mode}"
+                    f"{', память' if memory else ''}")
+
+    def disarm(self):
+        """Отменяет оставшиеся выполнения (текущее дописывается как обычно)."""
+        self._remaining = 0
+        if self._active is None:
+            self._stop_tracemalloc()
+
+    def _stop_tracemalloc(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def status(self) -> dict:
+        return {
+            "remaining": self._remaining,
+            "mode": self.mode,
+            "memory": self.memory,
+            "active": self._active.label if self._active else None,
+            "completed": list(self.completed)[-5:],
+        }
+
+    async def run(self, label: str, coro_func, *args):
+        """
+        Выполняет coro_func(*args), профилируя его, если профилировщик взведен.
+        """
+        if not self._remaining or self._active is not None:
+            return await coro_func(*args)
+
+        self._remaining -= 1
+        run = ProfileRun(label, self.mode, self.memory, self.output_dir, self.sample_interval)
+        self._active = run
+        run.start()
+        try:
+            return await coro_func(*args)
+        finally:
+            duration = run.stop()
+            self._active = None
+            try:
+                run.write(duration)
+                self.completed.append(run.path)
+                logger.info(f"🔬 Профиль {label} ({duration * 1000:.0f} мс) записан в {run.path}")
+            except Exception as e:
+                # Профиль - вспомогательные данные, задание из-за него не должно падать
+                logger.error(f"❌ Не удалось записать профиль {label}: {e}")
+            if not self._remaining:
+                self._stop_tracemalloc()
+
+    def traced(self, name: str):
+        """
+        Декоратор для тяжелого участка (create_post_image), вызываемого из любого
+        потока. Если сейчас ничего не профилируется, функция вызывается напрямую.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                run = self._active
+                if run is None:
+                    return func(*args, **kwargs)
+                with run.section(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Растры в разделяемой памяти для рендеринга в нескольких процессах.
+
+Процесс сервиса рендеринга один раз декодирует фон, рисует на нем
+постоянную часть карточки дня (базовый слой: месяц и дата) и публикует
+результат в сегменте multiprocessing.shared_memory. Процессы рендеринга
+подключают сегмент без копирования (массив NumPy поверх буфера сегмента)
+и копируют пиксели только в свой холст карточки.
+
+Время жизни сегментов:
+- владелец (SharedRasters) держит не больше max_segments сегментов и
+  удаляет (unlink) вытесненные и устаревшие (замена файла фона или шрифта),
+  как только их не использует ни одна пачка;
+- каждая задача передает процессу рендеринга имена живых сегментов, и
+  процесс закрывает подключения к остальным - удаленный сегмент не держится
+  в памяти процессом, который его подключил;
+- при остановке сервиса владелец удаляет все сегменты.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class _Segment:
+    """Сегмент владельца: ключ, разделяемая память, описание для процессов и число пользователей."""
+
+    def __init__(self, key, shm: shared_memory.SharedMemory, shape: tuple):
+        self.key = key
+        self.shm = shm
+        self.descriptor = {"name": shm.name, "shape": shape}
+        self.users = 0
+
+class SharedRasters:
+    """
+    Сегменты с растрами на стороне владельца (процесс сервиса рендеринга).
+    """
+
+    def __init__(self, max_segments: int = 4):
+        """
+        Args:
+            max_segments: Сколько сегментов держать (базовый слой 1600x1124 - ~5.4 МБ)
+        """
+        self.max_segments = max_segments
+        self._segments = OrderedDict()  # ключ -> _Segment
+        self._retired = {}              # имя -> _Segment, удаляется после release
+        self._building = {}             # ключ -> Event: растр строится вне блокировки
+        self._lock = threading.Lock()
+
+    def acquire(self, key, build) -> dict:
+        """
+        Описание сегмента по ключу; сегмент закреплен до release.
+        Вытесненный, но еще закрепленный сегмент с тем же ключом возвращается
+        в оборот; иначе build() строит растр (uint8-массив), и он публикуется.
+        build() выполняется без блокировки: другие пачки, release и status
+        его не ждут, а одновременные запросы того же ключа ждут одну сборку.
+
+        Returns:
+            {"name": имя сегмента, "shape": форма массива}
+        """
+        while True:
+            with self._lock:
+                segment = self._find(key)
+                if segment is not None:
+                    return self._pin(key, segment)
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    break
+            # Растр строит другая пачка; после сборки (или ее ошибки) ищем снова
+            building.wait()
+
+        shm = None
+        try:
+            array = build()
+            shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+            view = np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf)
+            view[...] = array
+            del view  # иначе буфер сегмента нельзя будет закрыть
+        except BaseException:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            with self._lock:
+                self._building.pop(key).set()
+            raise
+
+        with self._lock:
+            segment = _Segment(key, shm, array.shape)
+            self._segments[key] = segment
+            self._building.pop(key).set()
+            logger.info(f"🧩 Растр опубликован в {shm.name}: {array.nbytes / 1024 / 1024:.1f} МБ")
+            return self._pin(key, segment)
+
+    def release(self, descriptor: dict):
+        """Снимает закрепление; устаревший сегмент без пользователей удаляется."""
+        with self._lock:
+            segment = self._retired.get(descriptor["name"])
+            if segment is None:
+                segment = next(s for s in self._segments.values() if s.shm.name == descriptor["name"])
+            segment.users -= 1
+            if segment.users <= 0 and segment.shm.name in self._retired:
+                del self._retired[segment.shm.name]
+                self._unlink(segment)
+
+    def retire(self, predicate):
+        """Выводит из оборота сегменты, ключи которых подходят под predicate(key)."""
+        with self._lock:
+            for key in [key for key in self._segments if predicate(key)]:
+                segment = self._segments.pop(key)
+                segment.key = None  # устаревший растр в оборот не возвращается
+                self._retire(segment)
+
+    def names(self) -> list:
+        """Имена всех неудаленных сегментов (к ним процессы могут подключаться)."""
+        with self._lock:
+            return [s.shm.name for s in self._segments.values()] + list(self._retired)
+
+    def status(self) -> dict:
+        with self._lock:
+            segments = list(self._segments.values()) + list(self._retired.values())
+            return {
+                "segments": len(segments),
+                "retired": len(self._retired),
+                "mb": round(sum(s.shm.size for s in segments) / 1024 / 1024, 1),
+            }
+
+    def close(self):
+        """Удаляет все сегменты (остановка сервиса, процессы рендеринга уже завершены)."""
+        with self._lock:
+            for segment in list(self._segments.values()) + list(self._retired.values()):
+                self._unlink(segment)
+            self._segments.clear()
+            self._retired.clear()
+
+    def _find(self, key):
+        """Живой сегмент по ключу или вытесненный, но еще закрепленный (возвращается в оборот)."""
+        segment = self._segments.get(key)
+        if segment is None:
+            segment = next((s for s in self._retired.values() if s.key == key), None)
+            if segment is not None:
+                del self._retired[segment.shm.name]
+                self._segments[key] = segment
+        return segment
+
+    def _pin(self, key, segment: _Segment) -> dict:
+        """Закрепляет сегмент и вытесняет самые старые сверх max_segments."""
+        self._segments.move_to_end(key)
+        segment.users += 1
+        while len(self._segments) > self.max_segments:
+            _, oldest = self._segments.popitem(last=False)
+            self._retire(oldest)
+        return segment.descriptor
+
+    def _retire(self, segment: _Segment):
+        if segment.users > 0:
+            self._retired[segment.shm.name] = segment
+        else:
+            self._unlink(segment)
+
+    def _unlink(self, segment: _Segment):
+        segment.shm.close()
+        try:
+            segment.shm.unlink()
+        except FileNotFoundError:
+            pass
+        logger.info(f"🧹 Сегмент {segment.shm.name} удален")
+
+# ==================== СТОРОНА ПРОЦЕССА РЕНДЕРИНГА ====================
+_attached = {}  # имя -> (SharedMemory, массив поверх буфера)
+
+def attach(descriptor: dict, live_names=None) -> np.ndarray:
+    """
+    Растр сегмента без копирования (только чтение). Подключения к сегментам,
+    которых нет в live_names, закрываются.
+    """
+    if live_names is not None:
+        for name in [name for name in _attached if name not in live_names]:
+            shm, array = _attached.pop(name)
+            del array
+            shm.close()
+
+    entry = _attached.get(descriptor["name"])
+    if entry is None:
+        shm = shared_memory.SharedMemory(name=descriptor["name"])
+        array = np.ndarray(tuple(descriptor["shape"]), dtype=np.uint8, buffer=shm.buf)
+        array.setflags(write=False)
+        entry = _attached[descriptor["name"]] = (shm, array)
+    return entry[1]
+
+def process_memory() -> dict:
+    """
+    Память текущего процесса, МБ: rss - всего, private - собственные страницы,
+    shared - страницы разделяемой памяти (сегменты с растрами).
+    """
+    memory = {"pid": os.getpid()}
+    fields = {"VmRSS:": "rss", "RssAnon:": "private", "RssShmem:": "shared"}
+    try:
+        with open(f"/proc/{os.getpid()}/status", encoding="ascii") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    memory[fields[parts[0]]] = round(int(parts[1]) / 1024, 1)
+    except OSError:
+        # Не Linux: только пиковый RSS
+        import resource
+        memory["rss"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
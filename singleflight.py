@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single-flight: объединение одновременных запросов с одинаковым ключом.
+
+Если несколько корутин просят один и тот же результат (например, превью
+одного слота несколькими редакторами или превью, совпавшее с заданием
+по расписанию), вычисление запускается один раз, остальные ждут его и
+получают тот же результат. Успешные результаты кэшируются (LRU).
+"""
+
+import asyncio
+import functools
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Кэш с объединением одновременных вычислений по ключу.
+
+    Блокирующие функции выполняются в пуле потоков, поэтому цикл событий
+    не простаивает, пока рисуется изображение или читается файл.
+    """
+
+    def __init__(self, name: str, maxsize: int = 64, executor=None):
+        """
+        Args:
+            name: Имя для логов и статистики
+            maxsize: Сколько готовых результатов хранить
+            executor: Пул для вычислений (по умолчанию - пул цикла событий)
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.executor = executor
+        self._results = OrderedDict()
+        self._in_flight = {}
+        self.stats = {"hits": 0, "joined": 0, "computed": 0}
+
+    async def do(self, key, func, *args, executor=None):
+        """
+        Возвращает результат func(*args) для ключа, вычисляя его не более одного раза.
+
+        None и исключения не кэшируются: следующий запрос попробует снова.
+        executor задает пул для этого вычисления (по умолчанию - пул из конструктора);
+        запрос, присоединившийся к уже идущему вычислению, ждет его в том пуле.
+        """
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._results[key]
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats["joined"] += 1
+            logger.debug(f"[{self.name}] Ожидание уже идущего вычисления: {key}")
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor or self.executor, functools.partial(func, *args))
+        self._in_flight[key] = future
+        self.stats["computed"] += 1
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            self._in_flight.pop(key, None)
+
+        if result is not None:
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def forget(self, key):
+        """Удаляет результат из кэша (например, если файл изображения пропал)."""
+        self._results.pop(key, None)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Центральный планировщик работы бота с приоритетами и противодавлением.
+
+Два класса работы:
+- scheduled: публикации по расписанию - принимаются всегда и имеют строгий
+  приоритет (пока идет публикация, новая интерактивная работа не стартует);
+- interactive: команды пользователей - ограниченная очередь, лимит
+  одновременных выполнений и лимит частоты на пользователя. Если очередь
+  полна или лимит исчерпан, работа сразу отклоняется (WorkRejected);
+  отклоненная из-за очереди команда токен пользователя не тратит.
+
+Планировщик управляет допуском работы; рендеринг публикаций идет в
+отдельном пуле потоков (bot.scheduled_render_executor), чтобы не ждать
+за уже принятыми командами.
+
+Счетчики приема/отказов и время ожидания в очереди доступны через stats().
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class WorkRejected(Exception):
+    """Интерактивная работа не принята (reason: queue_full или rate_limited)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class WorkScheduler:
+    """
+    Планировщик асинхронной работы со строгим приоритетом расписания.
+    """
+
+    def __init__(self, interactive_workers: int = 2, interactive_queue_size: int = 20,
+                 user_rate: int = 5, user_period: float = 60.0):
+        """
+        Args:
+            interactive_workers: Сколько интерактивных задач выполняется одновременно
+            interactive_queue_size: Сколько интерактивных задач может ждать
+            user_rate: Сколько команд пользователь может подать за user_period
+            user_period: Окно лимита частоты, секунды
+        """
+        self.interactive_workers = interactive_workers
+        self.interactive_queue_size = interactive_queue_size
+        self.user_rate = user_rate
+        self.user_period = user_period
+
+        self._interactive_slots = asyncio.Semaphore(interactive_workers)
+        self._no_scheduled = asyncio.Event()
+        self._no_scheduled.set()
+        self._scheduled_running = 0
+        self._interactive_waiting = 0
+        self._interactive_running = 0
+        self._buckets = {}  # user_id -> (токены, время последнего пополнения)
+        self._buckets_pruned = time.monotonic()
+
+        self._counters = {
+            "scheduled_admitted": 0,
+            "interactive_admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_rate_limited": 0,
+        }
+        self._interactive_waits = deque(maxlen=1000)
+
+    # ---------- Публикации по расписанию ----------
+    async def run_scheduled(self, coro_func, *args):
+        """
+        Выполняет публикацию по расписанию: без очереди и без отказов.
+        """
+        self._counters["scheduled_admitted"] += 1
+        self._scheduled_running += 1
+        self._no_scheduled.clear()
+        try:
+            return await coro_func(*args)
+        finally:
+            self._scheduled_running -= 1
+            if not self._scheduled_running:
+                self._no_scheduled.set()
+
+    # ---------- Интерактивные команды ----------
+    def _take_token(self, user_id) -> bool:
+        """Токен-бакет на пользователя: user_rate токенов за user_period."""
+        if user_id is None or self.user_rate <= 0:
+            return True
+        now = time.monotonic()
+        self._prune_buckets(now)
+        tokens, updated = self._buckets.get(user_id, (float(self.user_rate), now))
+        tokens = min(float(self.user_rate), tokens + (now - updated) * self.user_rate / self.user_period)
+        if tokens < 1.0:
+            self._buckets[user_id] = (tokens, now)
+            return False
+        self._buckets[user_id] = (tokens - 1.0, now)
+        return True
+
+    def _prune_buckets(self, now: float):
+        """
+        Раз в user_period удаляет бакеты, которые успели наполниться: такой
+        бакет не отличается от отсутствующего, а словарь иначе растет с
+        каждым новым пользователем.
+        """
+        if now - self._buckets_pruned < self.user_period:
+            return
+        self._buckets_pruned = now
+        for user_id in [user_id for user_id, (_, updated) in self._buckets.items()
+                        if now - updated >= self.user_period]:
+            del self._buckets[user_id]
+
+    async def run_interactive(self, user_id, coro_func, *args):
+        """
+        Выполняет команду пользователя, если она принята.
+
+        Raises:
+            WorkRejected: очередь полна или пользователь превысил лимит частоты
+        """
+        # Очередь проверяется первой: отказ из-за очереди не тратит токен
+        if self._interactive_waiting >= self.interactive_queue_size:
+            self._counters["rejected_queue_full"] += 1
+            raise WorkRejected("queue_full")
+
+        if not self._take_token(user_id):
+            self._counters["rejected_rate_limited"] += 1
+            raise WorkRejected("rate_limited")
+
+        self._counters["interactive_admitted"] += 1
+        enqueued = time.monotonic()
+        self._interactive_waiting += 1
+        try:
+            await self._interactive_slots.acquire()
+            try:
+                # Строгий приоритет: ждем окончания текущих публикаций
+                await self._no_scheduled.wait()
+            except BaseException:
+                self._interactive_slots.release()
+                raise
+        finally:
+            self._interactive_waiting -= 1
+
+        self._interactive_waits.append(time.monotonic() - enqueued)
+        self._interactive_running += 1
+        try:
+            return await coro_func(*args)
+        finally:
+            self._interactive_running -= 1
+            self._interactive_slots.release()
+
+    # ---------- Метрики ----------
+    def stats(self) -> dict:
+        """
+        Счетчики и время ожидания интерактивной работы в очереди
+        (p50/p99/max по последним 1000 задачам, секунды).
+        Публикации по расписанию в очереди не ждут.
+        """
+        ordered = sorted(self._interactive_waits) or [0.0]
+        return {
+            **self._counters,
+            "scheduled_running": self._scheduled_running,
+            "interactive_running": self._interactive_running,
+            "interactive_waiting": self._interactive_waiting,
+            "rate_buckets": len(self._buckets),
+            "wait_p50": ordered[len(ordered) // 2],
+            "wait_p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            "wait_max": ordered[-1],
+        }